@@ -0,0 +1,26 @@
+"""Add intent column to chat_messages
+
+Revision ID: 8f3a1c2d9b40
+Revises: 2c14b0eb67e7
+Create Date: 2026-10-19 10:12:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision: str = '8f3a1c2d9b40'
+down_revision: Union[str, Sequence[str], None] = '2c14b0eb67e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_messages', sa.Column('intent', sa.String(length=50), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_messages', 'intent')
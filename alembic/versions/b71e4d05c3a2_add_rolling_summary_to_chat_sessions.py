@@ -0,0 +1,28 @@
+"""Add rolling summary columns to chat_sessions
+
+Revision ID: b71e4d05c3a2
+Revises: 8f3a1c2d9b40
+Create Date: 2026-10-19 11:40:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision: str = 'b71e4d05c3a2'
+down_revision: Union[str, Sequence[str], None] = '8f3a1c2d9b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_sessions', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('summary_message_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_sessions', 'summary_message_id')
+    op.drop_column('chat_sessions', 'summary')
@@ -0,0 +1,28 @@
+"""Add indexes for keyset-paginated chat history
+
+Revision ID: d2c8e9f41a67
+Revises: b71e4d05c3a2
+Create Date: 2026-10-19 13:05:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision: str = 'd2c8e9f41a67'
+down_revision: Union[str, Sequence[str], None] = 'b71e4d05c3a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_chat_messages_session_timestamp', 'chat_messages', ['session_id', 'timestamp'])
+    op.create_index('ix_chat_sessions_user_updated', 'chat_sessions', ['user_id', 'updated_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_sessions_user_updated', table_name='chat_sessions')
+    op.drop_index('ix_chat_messages_session_timestamp', table_name='chat_messages')
@@ -0,0 +1,32 @@
+"""Add exercise_queries for the write-through exercise catalog
+
+Revision ID: e5a7b3c19d02
+Revises: d2c8e9f41a67
+Create Date: 2026-10-19 15:40:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision: str = 'e5a7b3c19d02'
+down_revision: Union[str, Sequence[str], None] = 'd2c8e9f41a67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'exercise_queries',
+        sa.Column('params_key', sa.String(length=255), nullable=False),
+        sa.Column('exercise_ids', sa.JSON(), nullable=True),
+        sa.Column('fetched_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('params_key'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('exercise_queries')
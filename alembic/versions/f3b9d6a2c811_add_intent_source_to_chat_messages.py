@@ -0,0 +1,26 @@
+"""Add intent_source to chat_messages
+
+Revision ID: f3b9d6a2c811
+Revises: e5a7b3c19d02
+Create Date: 2026-10-19 18:05:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision: str = 'f3b9d6a2c811'
+down_revision: Union[str, Sequence[str], None] = 'e5a7b3c19d02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_messages', sa.Column('intent_source', sa.String(length=20), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_messages', 'intent_source')
@@ -0,0 +1,273 @@
+'''
+Bulk (re)indexing of daily knowledge documents.
+
+Streams every (user, date) that has tracking data, loads the facets chunk by
+chunk with get_users_daily_data, builds documents with build_daily_document
+in a process pool, and skips documents whose hash (and embedding model and
+layout) match user_embeddings_cache. Whatever changed is embedded in large
+batches and upserted into Qdrant as section chunks (build_daily_sections),
+sections that disappeared are deleted, and the cache rows are upserted in one
+statement per chunk. Progress is checkpointed after each chunk so an interrupted run can
+continue with --resume.
+
+    python -m server.knowledge_base.backfill --since 2025-01-01 --workers 4
+    python -m server.knowledge_base.backfill --resume
+    python -m server.knowledge_base.backfill --force      # after changing the embedding model
+'''
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Date, cast, func, inspect, select, tuple_, union
+from sqlalchemy.dialects.postgresql import insert
+
+from server.knowledge_base.document_builder import SECTIONS, build_daily_document, build_daily_sections
+
+CHECKPOINT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "storage", "backfill_checkpoint.json"
+)
+DEFAULT_CHUNK = 500
+DEFAULT_EMBED_BATCH = 128
+# how a day is split into points; bumping it re-indexes every day on the next run
+DOC_LAYOUT = "sections-v1"
+
+UserDate = Tuple[int, date]
+
+
+def _pairs_query(since: Optional[date], until: Optional[date], user_ids: Optional[Sequence[int]]):
+    """Distinct (user_id, day) over every table that feeds a daily document."""
+    from server.models import FoodEntry, SleepLog, UserStat, WaterLog, Workout
+
+    sources = [
+        (FoodEntry.user_id, cast(FoodEntry.timestamp, Date)),
+        (WaterLog.user_id, cast(WaterLog.timestamp, Date)),
+        (Workout.user_id, cast(Workout.date_performed, Date)),
+        (SleepLog.user_id, SleepLog.date),
+        (UserStat.user_id, UserStat.date),
+    ]
+    parts = []
+    for user_col, day_col in sources:
+        stmt = select(user_col.label("user_id"), day_col.label("day")).where(day_col.isnot(None))
+        if since:
+            stmt = stmt.where(day_col >= since)
+        if until:
+            stmt = stmt.where(day_col <= until)
+        if user_ids:
+            stmt = stmt.where(user_col.in_(user_ids))
+        parts.append(stmt)
+    return union(*parts).subquery("pairs")
+
+
+def stream_pairs(db, since=None, until=None, user_ids=None, after: Optional[UserDate] = None,
+                 chunk: int = DEFAULT_CHUNK) -> Iterator[List[UserDate]]:
+    pairs = _pairs_query(since, until, user_ids)
+    stmt = select(pairs.c.user_id, pairs.c.day).order_by(pairs.c.user_id, pairs.c.day)
+    if after:
+        stmt = stmt.where(tuple_(pairs.c.user_id, pairs.c.day) > tuple_(*after))
+    result = db.execute(stmt.execution_options(yield_per=chunk))
+    for partition in result.partitions(chunk):
+        yield [(user_id, day) for user_id, day in partition]
+
+
+def count_pairs(db, since=None, until=None, user_ids=None, after: Optional[UserDate] = None) -> int:
+    pairs = _pairs_query(since, until, user_ids)
+    stmt = select(func.count()).select_from(pairs)
+    if after:
+        stmt = stmt.where(tuple_(pairs.c.user_id, pairs.c.day) > tuple_(*after))
+    return db.execute(stmt).scalar() or 0
+
+
+def _plain(obj):
+    """Column-only, picklable copy of an ORM row for the worker processes."""
+    if obj is None:
+        return None
+    return SimpleNamespace(**{attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs})
+
+
+def _snapshot(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: [_plain(v) for v in value] if isinstance(value, list) else _plain(value)
+        for key, value in data.items()
+    }
+
+
+def _build(job: Tuple[int, date, Dict[str, Any]]) -> Tuple[int, date, str, Dict[str, Any], str, List[Dict[str, Any]]]:
+    user_id, day, data = job
+    document = build_daily_document(data, day)
+    text = document.get("text", "")
+    return (user_id, day, text, document.get("metadata", {}), hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            build_daily_sections(data, day))
+
+
+def _stale_ids(user_id: int, day: date, sections: List[Dict[str, Any]]) -> List[str]:
+    """Point ids of this day that the new chunks don't overwrite: missing sections and the pre-section document."""
+    from server.mcp_agents.agent_helpers import document_id
+
+    present = {chunk["metadata"]["section"] for chunk in sections}
+    return [document_id(user_id, day)] + [document_id(user_id, day, "daily_summary", name)
+                                          for name in SECTIONS if name not in present]
+
+
+def _load_checkpoint(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path: str, last: UserDate, totals: Dict[str, int]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"last": [last[0], last[1].isoformat()], "totals": totals,
+                   "updated_at": datetime.utcnow().isoformat()}, f)
+    os.replace(tmp, path)
+
+
+def _upsert_cache_rows(db, rows: List[Dict[str, Any]]):
+    from server.models import UserEmbeddingsCache
+
+    if not rows:
+        return
+    stmt = insert(UserEmbeddingsCache).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "date"],
+        set_={
+            "doc_hash": stmt.excluded.doc_hash,
+            "doc_metadata": stmt.excluded.doc_metadata,
+            "last_indexed": stmt.excluded.last_indexed,
+        },
+    )
+    db.execute(stmt)
+    db.commit()
+
+
+def process_chunk(db, pairs: List[UserDate], pool: Optional[ProcessPoolExecutor], embed_batch: int,
+                  force: bool = False, dry_run: bool = False) -> Dict[str, int]:
+    from server.knowledge_base.extractor import get_users_daily_data
+    from server.mcp_agents.agent_helpers import embed_model_id, index_delete_documents, index_insert_documents
+    from server.models import UserEmbeddingsCache
+
+    facets = get_users_daily_data(db, pairs)
+    jobs = [(u, d, _snapshot(facets[(u, d)])) for u, d in pairs if facets[(u, d)].get("user")]
+    built = list(pool.map(_build, jobs, chunksize=32)) if pool else [_build(job) for job in jobs]
+
+    cached = {
+        (row.user_id, row.date): row
+        for row in db.query(UserEmbeddingsCache.user_id, UserEmbeddingsCache.date,
+                            UserEmbeddingsCache.doc_hash, UserEmbeddingsCache.doc_metadata)
+        .filter(tuple_(UserEmbeddingsCache.user_id, UserEmbeddingsCache.date).in_(pairs))
+    }
+    db.rollback()  # don't hold the connection open while embedding
+    model_id = embed_model_id()
+
+    changed, empty = [], 0
+    for user_id, day, text, metadata, doc_hash, sections in built:
+        if not text.strip():
+            empty += 1
+            continue
+        entry = cached.get((user_id, day))
+        previous = (entry.doc_metadata or {}) if entry is not None else {}
+        if not force and entry is not None and entry.doc_hash == doc_hash \
+                and previous.get("embed_model") == model_id and previous.get("layout") == DOC_LAYOUT:
+            continue
+        metadata = {**metadata, "embed_model": model_id, "layout": DOC_LAYOUT,
+                    "sections": [chunk["metadata"]["section"] for chunk in sections]}
+        changed.append((user_id, day, metadata, doc_hash, sections))
+
+    if changed and not dry_run:
+        index_insert_documents(
+            [(u, chunk["text"], {**chunk["metadata"], "embed_model": model_id})
+             for u, _, _, _, sections in changed for chunk in sections],
+            batch_size=embed_batch,
+        )
+        if embed_model_id() != model_id:
+            # e.g. the sidecar failed and the in-process fallback runs another backend;
+            # leave the cache rows alone so these days are embedded and tagged again
+            raise RuntimeError(f"embedding backend changed while indexing (was {model_id})")
+        index_delete_documents([i for u, d, _, _, sections in changed for i in _stale_ids(u, d, sections)])
+        now = datetime.utcnow()
+        _upsert_cache_rows(db, [
+            {"user_id": u, "date": d, "doc_hash": h, "doc_metadata": meta, "last_indexed": now}
+            for u, d, meta, h, _ in changed
+        ])
+
+    return {
+        "pairs": len(pairs),
+        "indexed": len(changed),
+        "unchanged": len(built) - len(changed) - empty,
+        "empty": empty + len(pairs) - len(jobs),
+    }
+
+
+def run_backfill(since=None, until=None, user_ids=None, workers: int = os.cpu_count() or 1,
+                 chunk: int = DEFAULT_CHUNK, embed_batch: int = DEFAULT_EMBED_BATCH, resume: bool = False,
+                 force: bool = False, dry_run: bool = False, checkpoint: str = CHECKPOINT_PATH) -> Dict[str, int]:
+    from server.database import SessionLocal
+
+    after, totals = None, {"pairs": 0, "indexed": 0, "unchanged": 0, "empty": 0}
+    if resume:
+        state = _load_checkpoint(checkpoint)
+        if state.get("last"):
+            after = (int(state["last"][0]), date.fromisoformat(state["last"][1]))
+            totals.update(state.get("totals", {}))
+            print(f"[backfill] resuming after user {after[0]} {after[1]}")
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    started = time.perf_counter()
+    done_this_run = 0
+    try:
+        with SessionLocal() as stream_db, SessionLocal() as db:
+            total = count_pairs(db, since, until, user_ids, after)
+            db.rollback()
+            print(f"[backfill] {total} (user, date) pairs to check, {workers} worker(s), chunk={chunk}")
+            for pairs in stream_pairs(stream_db, since, until, user_ids, after, chunk):
+                stats = process_chunk(db, pairs, pool, embed_batch, force=force, dry_run=dry_run)
+                for key, value in stats.items():
+                    totals[key] = totals.get(key, 0) + value
+                done_this_run += len(pairs)
+                if not dry_run:
+                    _save_checkpoint(checkpoint, pairs[-1], totals)
+
+                elapsed = time.perf_counter() - started
+                rate = done_this_run / elapsed if elapsed else 0.0
+                eta = (total - done_this_run) / rate if rate else 0.0
+                print(
+                    f"[backfill] {done_this_run}/{total} pairs | indexed {totals['indexed']} "
+                    f"| unchanged {totals['unchanged']} | {rate:.1f} pairs/s | eta {eta:.0f}s"
+                )
+    finally:
+        if pool:
+            pool.shutdown()
+
+    if not dry_run and os.path.exists(checkpoint):
+        os.remove(checkpoint)  # finished: the next run starts from scratch
+    print(f"[backfill] done in {time.perf_counter() - started:.1f}s: {totals}")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill / re-index daily knowledge documents into Qdrant")
+    parser.add_argument("--since", type=date.fromisoformat)
+    parser.add_argument("--until", type=date.fromisoformat)
+    parser.add_argument("--user", type=int, action="append", dest="user_ids", help="limit to a user (repeatable)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="document builder processes")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="(user, date) pairs per batch")
+    parser.add_argument("--embed-batch", type=int, default=DEFAULT_EMBED_BATCH)
+    parser.add_argument("--resume", action="store_true", help="continue after the last checkpoint")
+    parser.add_argument("--force", action="store_true", help="re-embed even unchanged documents")
+    parser.add_argument("--dry-run", action="store_true", help="build and diff only, write nothing")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    args = parser.parse_args()
+
+    run_backfill(
+        since=args.since, until=args.until, user_ids=args.user_ids, workers=args.workers,
+        chunk=args.chunk, embed_batch=args.embed_batch, resume=args.resume,
+        force=args.force, dry_run=args.dry_run, checkpoint=args.checkpoint,
+    )
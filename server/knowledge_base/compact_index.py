@@ -0,0 +1,129 @@
+'''
+Remove duplicate vectors left by the old uuid4 document ids.
+
+Before ids were derived from (user_id, date, type), every re-index of a day
+appended another point. This scrolls the collection (payload only), groups
+points by (user_id, date, type, section) and, per group, keeps exactly one
+point under the deterministic id: if it already exists the others are
+deleted, otherwise the newest point is copied to the deterministic id first, and the group's
+old points are only deleted once that copy was written. Deletes and copies
+are sent in batches.
+
+    python -m server.knowledge_base.compact_index --dry-run
+    python -m server.knowledge_base.compact_index --batch 500
+'''
+import argparse
+import json
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from qdrant_client import models as qmodels
+
+GROUP_FIELDS = ["user_id", "date", "type", "section", "indexed_at"]
+
+
+def _chunks(items: List, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def scan_groups(client, collection: str, batch: int) -> Dict[Tuple[str, str, str, str], List[Tuple[str, str]]]:
+    """(user_id, date, type, section) -> [(point id, indexed_at)] for every point carrying a user and date."""
+    groups = defaultdict(list)
+    offset, scanned = None, 0
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            limit=batch,
+            offset=offset,
+            with_payload=qmodels.PayloadSelectorInclude(include=GROUP_FIELDS),
+            with_vectors=False,
+        )
+        for point in points:
+            payload = point.payload or {}
+            if payload.get("user_id") is None or not payload.get("date"):
+                continue
+            key = (str(payload["user_id"]), str(payload["date"]), payload.get("type") or "daily_summary",
+                   payload.get("section") or "")
+            groups[key].append((str(point.id), payload.get("indexed_at") or ""))
+        scanned += len(points)
+        print(f"[compact] scanned {scanned} points")
+        if offset is None:
+            return groups
+
+
+def _rekeyed(record, canonical_id: str) -> qmodels.PointStruct:
+    payload = dict(record.payload or {})
+    for field in ("doc_id", "document_id", "ref_doc_id"):
+        if field in payload:
+            payload[field] = canonical_id
+    if isinstance(payload.get("_node_content"), str):
+        try:
+            node = json.loads(payload["_node_content"])
+            node["id_"] = canonical_id
+            payload["_node_content"] = json.dumps(node)
+        except ValueError:
+            pass
+    return qmodels.PointStruct(id=canonical_id, vector=record.vector, payload=payload)
+
+
+def compact(batch: int = 500, dry_run: bool = False) -> Dict[str, int]:
+    from server.mcp_agents.agent_helpers import QDRANT_COLLECTION, document_id, get_qdrant_client
+
+    client = get_qdrant_client()
+    started = time.perf_counter()
+    groups = scan_groups(client, QDRANT_COLLECTION, batch)
+
+    to_delete: List[str] = []
+    # (source id, canonical id, the group's other ids): deleted only after the copy lands
+    to_copy: List[Tuple[str, str, List[str]]] = []
+    for (user_id, day, doc_type, section), points in groups.items():
+        canonical = document_id(user_id, day, doc_type, section or None)
+        ids = [pid for pid, _ in points]
+        if ids == [canonical]:
+            continue
+        stale = [pid for pid in ids if pid != canonical]
+        if canonical in ids:
+            to_delete.extend(stale)
+        else:
+            # newest indexed_at; legacy points without one tie-break on id, so reruns pick the same point
+            newest = max(points, key=lambda p: (p[1], p[0]))[0]
+            to_copy.append((newest, canonical, stale))
+
+    stats = {"groups": len(groups), "copied": len(to_copy),
+             "deleted": len(to_delete) + sum(len(stale) for _, _, stale in to_copy)}
+    if dry_run:
+        print(f"[compact] dry run: {stats}")
+        return stats
+
+    copied, skipped = 0, 0
+    for chunk in _chunks(to_copy, batch):
+        records = client.retrieve(QDRANT_COLLECTION, ids=[src for src, _, _ in chunk], with_payload=True, with_vectors=True)
+        by_id = {str(r.id): r for r in records}
+        done = [(src, dst, stale) for src, dst, stale in chunk if src in by_id]
+        skipped += len(chunk) - len(done)
+        if done:
+            client.upsert(QDRANT_COLLECTION, points=[_rekeyed(by_id[src], dst) for src, dst, _ in done], wait=True)
+            for _, _, stale in done:
+                to_delete.extend(stale)
+            copied += len(done)
+        print(f"[compact] re-keyed {len(done)} points")
+    stats.update(copied=copied, deleted=len(to_delete), skipped=skipped)
+    if skipped:
+        print(f"[compact] {skipped} groups kept as-is: source point vanished before it could be copied")
+
+    for chunk in _chunks(to_delete, batch):
+        client.delete(QDRANT_COLLECTION, points_selector=qmodels.PointIdsList(points=chunk), wait=True)
+        print(f"[compact] deleted {len(chunk)} duplicates")
+
+    print(f"[compact] done in {time.perf_counter() - started:.1f}s: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deduplicate knowledge-base vectors onto deterministic ids")
+    parser.add_argument("--batch", type=int, default=500, help="points per scroll/upsert/delete request")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args()
+    compact(batch=args.batch, dry_run=args.dry_run)
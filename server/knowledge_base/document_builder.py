@@ -1,15 +1,17 @@
 
 from datetime import date
-from typing import Dict, Any
+from typing import Any, Dict, List
 
 def safe(val, default=""):
     return str(val) if val is not None else default
 
-def build_daily_document(data: Dict[str, Any], target_date: date) -> Dict[str, str]:
-    """
-    Convert extracted structured data into a daily knowledge document.
-    Returns a dict with 'text' and 'metadata' keys.
-    """
+# Retrieval chunks: each daily document is also split into these sections
+# (metadata["section"]) so a question only pulls the part it is about
+SECTIONS = ["profile", "body", "workouts", "nutrition", "sleep", "hydration"]
+
+
+def _daily_parts(data: Dict[str, Any], target_date: date) -> Dict[str, List[str]]:
+    """Lines of a daily document grouped by part, in document order."""
     user = data.get("user")
     profile = data.get("profile")
     stats = data.get("stats")
@@ -19,44 +21,42 @@ def build_daily_document(data: Dict[str, Any], target_date: date) -> Dict[str, s
     water_logs = data.get("water_logs") or []
     goal = data.get("goal")
 
-    if not user:
-        return {"text": "", "metadata": {"valid": False}}
-
-    lines = []
-    lines.append(f"User: {safe(user.name)} (id={user.user_id})")
+    parts = {key: [] for key in ("user", "profile", "date", "goal", "stats",
+                                 "workouts", "nutrition", "sleep", "hydration", "insights")}
+    parts["user"].append(f"User: {safe(user.name)} (id={user.user_id})")
     if profile:
-        lines.append(f"Profile: gender={safe(profile.gender)}, age={safe(profile.age)}, activity_level={safe(profile.activity_level)}, experience={safe(profile.fitness_experience)}")
+        parts["profile"].append(f"Profile: gender={safe(profile.gender)}, age={safe(profile.age)}, activity_level={safe(profile.activity_level)}, experience={safe(profile.fitness_experience)}")
         if profile.dietary_restrictions:
-            lines.append(f"Dietary restrictions: {safe(profile.dietary_restrictions)}")
+            parts["profile"].append(f"Dietary restrictions: {safe(profile.dietary_restrictions)}")
         if profile.health_condition:
-            lines.append(f"Health conditions: {safe(profile.health_condition)}")
+            parts["profile"].append(f"Health conditions: {safe(profile.health_condition)}")
 
-    lines.append(f"Date: {target_date.isoformat()}")
+    parts["date"].append(f"Date: {target_date.isoformat()}")
 
     if goal:
-        lines.append(f"Active goal: {safe(goal.goal_type)} — target: {safe(goal.target_weight_value)} kg by {safe(goal.target_date)}; status={safe(goal.status)}")
+        parts["goal"].append(f"Active goal: {safe(goal.goal_type)} — target: {safe(goal.target_weight_value)} kg by {safe(goal.target_date)}; status={safe(goal.status)}")
 
     if stats:
-        lines.append(f"Daily stats: weight={safe(stats.weight_kg)} kg, BMI={safe(stats.bmi)}, body_fat%={safe(stats.body_fat_percent)}, muscle_mass={safe(stats.muscle_mass_kg)} kg")
+        parts["stats"].append(f"Daily stats: weight={safe(stats.weight_kg)} kg, BMI={safe(stats.bmi)}, body_fat%={safe(stats.body_fat_percent)}, muscle_mass={safe(stats.muscle_mass_kg)} kg")
 
     if workouts:
         total_cal = sum((w.calories_burned or 0) for w in workouts)
-        lines.append(f"Workouts: {len(workouts)} session(s), total_calories_burned={total_cal}")
+        parts["workouts"].append(f"Workouts: {len(workouts)} session(s), total_calories_burned={total_cal}")
         for w in workouts:
-            lines.append(f" - {safe(w.name)}: type={safe(w.workout_type)}, dur={safe(w.duration_minutes)}min, calories={safe(w.calories_burned)}, date={safe(w.date_performed)}")
+            parts["workouts"].append(f" - {safe(w.name)}: type={safe(w.workout_type)}, dur={safe(w.duration_minutes)}min, calories={safe(w.calories_burned)}, date={safe(w.date_performed)}")
 
     if meals:
         total_cal = sum((m.calories or 0) for m in meals)
-        lines.append(f"Nutrition: {len(meals)} entries, total_calories={total_cal}")
+        parts["nutrition"].append(f"Nutrition: {len(meals)} entries, total_calories={total_cal}")
         for m in meals[:8]:  # keep examples short
-            lines.append(f" - {safe(m.food_name)}: {safe(m.quantity)} {safe(m.unit)}, cals={safe(m.calories)}, protein={safe(m.protein)}, carbs={safe(m.carbohydrates)}, fats={safe(m.fats)}")
+            parts["nutrition"].append(f" - {safe(m.food_name)}: {safe(m.quantity)} {safe(m.unit)}, cals={safe(m.calories)}, protein={safe(m.protein)}, carbs={safe(m.carbohydrates)}, fats={safe(m.fats)}")
 
     if sleep:
-        lines.append(f"Sleep: duration_hours={safe(sleep.sleep_duration_hours)}, quality={safe(sleep.sleep_quality_label)}, bedtime={safe(sleep.bedtime)}, wake_up={safe(sleep.wake_up)}")
+        parts["sleep"].append(f"Sleep: duration_hours={safe(sleep.sleep_duration_hours)}, quality={safe(sleep.sleep_quality_label)}, bedtime={safe(sleep.bedtime)}, wake_up={safe(sleep.wake_up)}")
 
     if water_logs:
         total_ml = sum((w.amount_ml or 0) for w in water_logs)
-        lines.append(f"Hydration: total={total_ml} ml")
+        parts["hydration"].append(f"Hydration: total={total_ml} ml")
 
     # small derived insights (simple heuristics)
     insights = []
@@ -69,18 +69,54 @@ def build_daily_document(data: Dict[str, Any], target_date: date) -> Dict[str, s
         except Exception:
             pass
 
-    if not insights:
-        insights_text = ""
-    else:
-        insights_text = "Insights: " + " | ".join(insights)
-        lines.append(insights_text)
+    if insights:
+        parts["insights"].append("Insights: " + " | ".join(insights))
+    return parts
+
 
-    text = "\n".join(lines)
-    metadata = {
+def _metadata(user, target_date: date) -> Dict[str, Any]:
+    return {
         "type": "daily_summary",
         "user_id": str(user.user_id),
         "date": target_date.isoformat()
     }
 
-    return {"text": text, "metadata": metadata}
 
+def build_daily_document(data: Dict[str, Any], target_date: date) -> Dict[str, Any]:
+    """
+    Convert extracted structured data into a daily knowledge document.
+    Returns a dict with 'text' and 'metadata' keys.
+    """
+    user = data.get("user")
+    if not user:
+        return {"text": "", "metadata": {"valid": False}}
+
+    parts = _daily_parts(data, target_date)
+    text = "\n".join(line for lines in parts.values() for line in lines)
+    return {"text": text, "metadata": _metadata(user, target_date)}
+
+
+def build_daily_sections(data: Dict[str, Any], target_date: date) -> List[Dict[str, Any]]:
+    """
+    The same daily document as typed section chunks, one per SECTIONS entry
+    that has data. Each chunk repeats the user/date header so it reads on its
+    own, and its metadata carries section=<name>.
+    """
+    user = data.get("user")
+    if not user:
+        return []
+
+    parts = _daily_parts(data, target_date)
+    header = parts["user"] + parts["date"]
+    sections = {
+        "profile": parts["profile"] + parts["goal"],
+        "body": parts["stats"] + parts["insights"],
+        "workouts": parts["workouts"],
+        "nutrition": parts["nutrition"],
+        "sleep": parts["sleep"],
+        "hydration": parts["hydration"],
+    }
+    return [
+        {"text": "\n".join(header + lines), "metadata": {**_metadata(user, target_date), "section": name}}
+        for name, lines in sections.items() if lines
+    ]
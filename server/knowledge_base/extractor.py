@@ -1,7 +1,9 @@
-from datetime import date
-from typing import Dict,Any
+import json
+from datetime import date,datetime,time
+from decimal import Decimal
+from typing import Dict,Any,Iterable,List,Optional,Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func,cast,Date
+from sqlalchemy import func,cast,select,inspect,literal_column,tuple_,Date,DateTime,Time,Float,Numeric,Boolean,Enum,JSON,Text
 from fastapi import Depends
 
 from server.models import(
@@ -10,67 +12,134 @@ from server.models import(
 from server.database import get_db
 from server.auth import get_current_user
 
+UserDate = Tuple[int, date]
+
+
+def _as_date(value) -> date:
+    return value.date() if hasattr(value, "date") and callable(value.date) else value
+
+
+def _on(rows: List[Any], attr: str, target_date: date) -> List[Any]:
+    return [r for r in rows if _as_date(getattr(r, attr)) == target_date]
+
+
+def _facet_json(dialect: str, model, *where):
+    """Correlated subquery: the matching rows of `model` as one JSON array (text), NULL when none."""
+    sqlite = dialect == "sqlite"
+    args = []
+    for column in model.__table__.columns:
+        value = func.json(column) if sqlite and isinstance(column.type, JSON) else column
+        args += [literal_column(f"'{column.name}'"), value]
+    row = func.json_object(*args) if sqlite else func.json_build_object(*args)
+    rows = func.json_group_array(row) if sqlite else func.json_agg(row)
+    return select(cast(rows, Text)).where(*where).scalar_subquery()
+
+
+def _from_json(type_, value):
+    if value is None:
+        return None
+    if isinstance(type_, Enum) and type_.enum_class is not None:
+        return type_.enum_class[value]
+    if isinstance(type_, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(type_, Date):
+        return date.fromisoformat(value[:10])
+    if isinstance(type_, Time):
+        return time.fromisoformat(value)
+    if isinstance(type_, Float):
+        return float(value)
+    if isinstance(type_, Numeric):
+        # same scale the ORM would return, so document text (and its hash) is unchanged
+        value = Decimal(str(value))
+        return value.quantize(Decimal(1).scaleb(-type_.scale)) if type_.scale else value
+    if isinstance(type_, Boolean):
+        return bool(value)
+    return value
+
+
+def _revive(model, raw: Optional[str]) -> List[Any]:
+    """Transient `model` instances from a _facet_json array, in primary-key order."""
+    if not raw:
+        return []
+    mapper = inspect(model)
+    objects = [
+        model(**{attr.key: _from_json(attr.columns[0].type, item.get(attr.columns[0].name))
+                 for attr in mapper.column_attrs})
+        for item in json.loads(raw, parse_float=Decimal)
+    ]
+    pk = mapper.primary_key[0].key
+    return sorted(objects, key=lambda o: getattr(o, pk))
+
+
+def get_users_daily_data(
+    db: Session,
+    pairs: Iterable[UserDate],
+    users: Optional[Dict[int, User]] = None,
+) -> Dict[UserDate, Dict[str, Any]]:
+    """
+    Daily data for many (user_id, date) pairs in one round trip: a single SELECT
+    over users with one correlated JSON-aggregate subquery per facet (profile,
+    active goals, stats, workouts, meals, sleep, water), restricted to the
+    requested pairs. Facet rows come back as transient ORM instances with the
+    same column values, so document_builder reads them as before. Users passed
+    in are reused instead of being loaded again.
+    Returns {(user_id, date): same dict as get_user_daily_data}.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    if not pairs:
+        return {}
+    user_ids = sorted({user_id for user_id, _ in pairs})
+    users = dict(users or {})
+    dialect = db.get_bind().dialect.name
+
+    facets = {
+        "profile": (UserProfile, [UserProfile.user_id == User.user_id]),
+        "goals": (FitnessGoal, [FitnessGoal.user_id == User.user_id, FitnessGoal.status == "active"]),
+        "stats": (UserStat, [UserStat.user_id == User.user_id, tuple_(UserStat.user_id, UserStat.date).in_(pairs)]),
+        "workouts": (Workout, [Workout.user_id == User.user_id,
+                               tuple_(Workout.user_id, cast(Workout.date_performed, Date)).in_(pairs)]),
+        "meals": (FoodEntry, [FoodEntry.user_id == User.user_id,
+                              tuple_(FoodEntry.user_id, cast(FoodEntry.timestamp, Date)).in_(pairs)]),
+        "sleep": (SleepLog, [SleepLog.user_id == User.user_id, tuple_(SleepLog.user_id, SleepLog.date).in_(pairs)]),
+        "water_logs": (WaterLog, [WaterLog.user_id == User.user_id,
+                                  tuple_(WaterLog.user_id, cast(WaterLog.timestamp, Date)).in_(pairs)]),
+    }
+    missing = [uid for uid in user_ids if uid not in users]
+    stmt = select(
+        User if missing else User.user_id,
+        *[_facet_json(dialect, model, *where).label(name) for name, (model, where) in facets.items()],
+    ).where(User.user_id.in_(user_ids))
+
+    loaded = {}
+    for row in db.execute(stmt):
+        user = row[0] if missing else users[row[0]]
+        users.setdefault(user.user_id, user)
+        loaded[user.user_id] = {name: _revive(model, getattr(row, name)) for name, (model, _) in facets.items()}
+
+    result = {}
+    for user_id, target_date in pairs:
+        key = (user_id, target_date)
+        user = users.get(user_id)
+        if not user or user_id not in loaded:
+            result[key] = {"user": None}
+            continue
+        facet = loaded[user_id]
+        result[key] = {
+            "user": user,
+            "profile": (facet["profile"] or [None])[0],
+            "stats": (_on(facet["stats"], "date", target_date) or [None])[0],
+            "workouts": _on(facet["workouts"], "date_performed", target_date),
+            "meals": _on(facet["meals"], "timestamp", target_date),
+            "sleep": (_on(facet["sleep"], "date", target_date) or [None])[0],
+            "water_logs": _on(facet["water_logs"], "timestamp", target_date),
+            "goal": (facet["goals"] or [None])[0],
+        }
+    return result
+
+
 def get_user_daily_data(target_date:date,db:Session=Depends(get_db),current_user=Depends(get_current_user)) -> Dict[str,Any]:
     """ Query the database for a user's daily data. Returns a dict with user, profile, stats,
-      workouts, meals, sleep, water_logs, goal. """
+      workouts, meals, sleep, water_logs, goal. Reuses the already loaded current_user. """
     user_id=current_user.user_id
-    user=db.query(User).filter(User.user_id==user_id).first()
-    if not user:
-        return {"user":None}
-    profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
-
-    stats = (
-        db.query(UserStat)
-        .filter(UserStat.user_id == user_id, UserStat.date == target_date)
-        .first()
-    )
-
-    workouts = (
-        db.query(Workout)
-        .filter(
-            Workout.user_id == user_id,
-            cast(Workout.date_performed, Date) == target_date
-        )
-        .all()
-    )
-
-    meals = (
-        db.query(FoodEntry)
-        .filter(
-            cast(FoodEntry.timestamp, Date) == target_date,
-            FoodEntry.user_id == user_id
-        )
-        .all()
-    )
-
-    sleep = (
-        db.query(SleepLog)
-        .filter(SleepLog.user_id == user_id, SleepLog.date == target_date)
-        .first()
-    )
-
-    water_logs = (
-        db.query(WaterLog)
-        .filter(
-            cast(WaterLog.timestamp, Date) == target_date,
-            WaterLog.user_id == user_id
-        )
-        .all()
-    )
-
-    goal = (
-        db.query(FitnessGoal)
-        .filter(FitnessGoal.user_id == user_id, FitnessGoal.status == "active")
-        .first()
-    )
-
-    return {
-        "user": user,
-        "profile": profile,
-        "stats": stats,
-        "workouts": workouts,
-        "meals": meals,
-        "sleep": sleep,
-        "water_logs": water_logs,
-        "goal": goal,
-    }
+    data=get_users_daily_data(db,[(user_id,target_date)],users={user_id:current_user})
+    return data[(user_id,target_date)]
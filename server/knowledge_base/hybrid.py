@@ -0,0 +1,109 @@
+'''
+Sparse (BM25) side of hybrid retrieval.
+
+Documents and queries are turned into sparse vectors that Qdrant stores next
+to the dense embedding. Terms are hashed to stable indices, so there is no
+vocabulary to keep in sync. Document values hold the BM25 term-frequency
+part. The collection's sparse vector uses Qdrant's IDF modifier, so the
+server applies the IDF half at query time from live collection statistics.
+Query values are plain term weights.
+
+Dense and sparse results are combined with reciprocal-rank fusion (RRF).
+Ranks are comparable across the two searches even though a cosine score and
+a BM25 score are not.
+'''
+import os
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+# daily documents are short and similar in length; a fixed average keeps
+# document vectors independent of the rest of the collection
+BM25_AVG_DOC_LEN = float(os.getenv("BM25_AVG_DOC_LEN", 120))
+RRF_K = int(os.getenv("RRF_K", 60))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it me my of on or so that the this to was "
+    "what when which with you your do did does can should would".split()
+)
+
+SparseVectors = Tuple[List[List[int]], List[List[float]]]
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def term_index(term: str) -> int:
+    # stable across processes (unlike hash()), within Qdrant's uint32 index range
+    return zlib.crc32(term.encode("utf-8")) & 0x7FFFFFFF
+
+
+def _to_sparse(weights: Dict[int, float]) -> Tuple[List[int], List[float]]:
+    indices = sorted(weights)
+    return indices, [weights[i] for i in indices]
+
+
+def bm25_document_vector(text: str) -> Tuple[List[int], List[float]]:
+    tokens = tokenize(text)
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_DOC_LEN)
+    weights: Dict[int, float] = {}
+    for term, tf in Counter(tokens).items():
+        index = term_index(term)
+        weights[index] = weights.get(index, 0.0) + tf * (BM25_K1 + 1) / (tf + norm)
+    return _to_sparse(weights)
+
+
+def bm25_query_vector(text: str) -> Tuple[List[int], List[float]]:
+    return _to_sparse({term_index(term): 1.0 for term in set(tokenize(text))})
+
+
+def sparse_doc_fn(texts: List[str]) -> SparseVectors:
+    """SparseEncoderCallable for QdrantVectorStore (documents)."""
+    vectors = [bm25_document_vector(t) for t in texts]
+    return [i for i, _ in vectors], [v for _, v in vectors]
+
+
+def sparse_query_fn(texts: List[str]) -> SparseVectors:
+    """SparseEncoderCallable for QdrantVectorStore (queries)."""
+    vectors = [bm25_query_vector(t) for t in texts]
+    return [i for i, _ in vectors], [v for _, v in vectors]
+
+
+def rrf_scores(rankings: List[List[str]], weights: Optional[List[float]] = None, k: int = RRF_K) -> Dict[str, float]:
+    """id -> sum(weight / (k + rank)) over every ranking the id appears in (rank starts at 1)."""
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, node_id in enumerate(ranking, start=1):
+            scores[node_id] = scores.get(node_id, 0.0) + weight / (k + rank)
+    return scores
+
+
+def rrf_fusion(dense_result, sparse_result, alpha: float = 0.5, top_k: int = 2):
+    """
+    hybrid_fusion_fn for QdrantVectorStore: RRF over the dense and sparse
+    result lists. alpha weights the dense side (0.5 = equal weight).
+    """
+    from llama_index.core.vector_stores.types import VectorStoreQueryResult
+
+    nodes = {}
+    rankings = []
+    for result in (dense_result, sparse_result):
+        ranking = []
+        for node in result.nodes or []:
+            nodes.setdefault(node.node_id, node)
+            ranking.append(node.node_id)
+        rankings.append(ranking)
+
+    scores = rrf_scores(rankings, weights=[alpha, 1 - alpha])
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return VectorStoreQueryResult(
+        nodes=[nodes[i] for i in ranked],
+        similarities=[scores[i] for i in ranked],
+        ids=ranked,
+    )
@@ -0,0 +1,112 @@
+'''
+Compact multi-day summary of a user's own tracking data for the chat agent.
+
+All metrics for the window come back in a single UNION ALL over the per-day
+rollups (daily_nutrition_logs, sleep_logs, and water_logs / workouts grouped
+by day), plus one query for the active goal: two round trips regardless of how
+many days are requested.
+'''
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Date, Float, cast, func, literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+from server.models import DailyNutritionLog, FitnessGoal, SleepLog, WaterLog, Workout
+
+MAX_SUMMARY_DAYS = 31
+
+
+def _f(value) -> Optional[float]:
+    return round(float(value), 1) if value is not None else None
+
+
+def _select_metric(metric: str, day, *values):
+    columns = [cast(v, Float) for v in values] + [cast(null(), Float)] * (4 - len(values))
+    return select(
+        literal(metric).label("metric"),
+        day.label("day"),
+        *[c.label(f"v{i + 1}") for i, c in enumerate(columns)],
+    )
+
+
+def _rollup_query(user_id: int, start: date, end: date):
+    nutrition = (
+        func.sum(DailyNutritionLog.calories),
+        func.sum(DailyNutritionLog.protein_grams),
+        func.sum(DailyNutritionLog.carbs_grams),
+        func.sum(DailyNutritionLog.fat_grams),
+    )
+    parts = [
+        # metric, day, v1..v4
+        _select_metric("nutrition", DailyNutritionLog.date, *nutrition)
+        .where(DailyNutritionLog.user_id == user_id, DailyNutritionLog.date.between(start, end))
+        .group_by(DailyNutritionLog.date),
+        _select_metric(
+            "sleep", SleepLog.date,
+            func.max(SleepLog.sleep_duration_hours), func.max(SleepLog.sleep_quality_score),
+        )
+        .where(SleepLog.user_id == user_id, SleepLog.date.between(start, end))
+        .group_by(SleepLog.date),
+        _select_metric("water", cast(WaterLog.timestamp, Date), func.sum(WaterLog.amount_ml))
+        .where(WaterLog.user_id == user_id, cast(WaterLog.timestamp, Date).between(start, end))
+        .group_by(cast(WaterLog.timestamp, Date)),
+        _select_metric(
+            "workouts", cast(Workout.date_performed, Date),
+            func.count(Workout.workout_id), func.sum(Workout.calories_burned), func.sum(Workout.duration_minutes),
+        )
+        .where(Workout.user_id == user_id, cast(Workout.date_performed, Date).between(start, end))
+        .group_by(cast(Workout.date_performed, Date)),
+    ]
+    return union_all(*parts)
+
+
+def get_recent_summary(db: Session, user_id: int, days: int = 7, end: Optional[date] = None) -> Dict[str, Any]:
+    """Per-day nutrition, hydration, sleep and workout numbers for the last `days` days, with averages."""
+    days = max(1, min(int(days), MAX_SUMMARY_DAYS))
+    end = end or date.today()
+    start = end - timedelta(days=days - 1)
+
+    by_day: Dict[date, Dict[str, Any]] = {}
+    for metric, day, v1, v2, v3, v4 in db.execute(_rollup_query(user_id, start, end)):
+        row = by_day.setdefault(day, {})
+        if metric == "nutrition":
+            row.update(calories=_f(v1), protein_g=_f(v2), carbs_g=_f(v3), fat_g=_f(v4))
+        elif metric == "sleep":
+            row.update(sleep_hours=_f(v1), sleep_quality=_f(v2))
+        elif metric == "water":
+            row.update(water_ml=_f(v1))
+        elif metric == "workouts":
+            row.update(workouts=int(v1 or 0), workout_calories=_f(v2), workout_minutes=_f(v3))
+
+    goal = (
+        db.query(FitnessGoal)
+        .filter(FitnessGoal.user_id == user_id, FitnessGoal.status == "active")
+        .order_by(FitnessGoal.created_at.desc())
+        .first()
+    )
+
+    daily: List[Dict[str, Any]] = [
+        {"date": day.isoformat(), **by_day[day]} for day in sorted(by_day)
+    ]
+    averages = {}
+    for key in ("calories", "protein_g", "water_ml", "sleep_hours", "workout_minutes"):
+        values = [d[key] for d in daily if d.get(key) is not None]
+        if values:
+            averages[key] = round(sum(values) / len(values), 1)
+
+    return {
+        "user_id": user_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "days_with_data": len(daily),
+        "averages": averages,
+        "daily": daily,
+        "goal": {
+            "type": goal.goal_type,
+            "target_weight_kg": _f(goal.target_weight_value),
+            "target_calories": _f(goal.target_calorie_value),
+            "target_protein_g": _f(goal.target_protien_value),
+            "target_date": goal.target_date.isoformat() if goal.target_date else None,
+        } if goal else None,
+    }
@@ -0,0 +1,195 @@
+'''
+Offline retrieval benchmark: dense vs sparse (BM25) vs hybrid (RRF).
+
+Builds daily section chunks from the database (same path as the backfill), indexes
+them into a throwaway collection, which by default lives in an in-memory
+Qdrant so no service is needed, and runs known-item queries through
+retrieve_user_docs in each mode. For every mode it reports hit@k, recall@k,
+MRR and latency percentiles.
+
+Queries are generated from the documents themselves: a food, workout or BMI
+value seen in one of a user's days. A query's relevant set is every chunk
+of that user containing the phrase. A hand-written set can be passed as JSONL
+with --queries-file, one object per line:
+{"user_id": 1, "query": "...", "relevant": ["2025-03-02", ...]}.
+
+    python -m server.knowledge_base.retrieval_benchmark --limit 1000 --queries 200
+    python -m server.knowledge_base.retrieval_benchmark --qdrant http://localhost:6333 --collection kb_bench
+'''
+import argparse
+import json
+import random
+import re
+import statistics
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from server.knowledge_base.backfill import _build, _snapshot, stream_pairs
+from server.knowledge_base.document_builder import SECTIONS
+
+MODES = ["dense", "sparse", "hybrid"]
+
+_MEAL = re.compile(r"^ - (?P<name>[^:]+): [\d.]+ ", re.M)
+_WORKOUT = re.compile(r"^ - (?P<name>[^:]+): type=", re.M)
+_BMI = re.compile(r"BMI=(?P<value>[\d.]+)")
+
+Doc = Tuple[int, str, str, Dict[str, Any]]  # (user_id, doc id, text, metadata)
+
+
+def load_documents(since=None, until=None, user_ids=None, limit: int = 1000) -> List[Doc]:
+    from server.database import SessionLocal
+    from server.knowledge_base.extractor import get_users_daily_data
+    from server.mcp_agents.agent_helpers import document_id
+
+    docs: List[Doc] = []
+    with SessionLocal() as stream_db, SessionLocal() as db:
+        for pairs in stream_pairs(stream_db, since, until, user_ids, chunk=min(limit, 500)):
+            facets = get_users_daily_data(db, pairs)
+            for u, d in pairs:
+                if not facets[(u, d)].get("user"):
+                    continue
+                user_id, day, _, _, _, sections = _build((u, d, _snapshot(facets[(u, d)])))
+                for chunk in sections:  # indexed the way production indexes them
+                    meta = chunk["metadata"]
+                    docs.append((user_id, document_id(user_id, day, meta["type"], meta["section"]),
+                                 chunk["text"], meta))
+                if len(docs) >= limit:
+                    return docs
+    return docs
+
+
+def generate_queries(docs: List[Doc], count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Known-item queries; relevant = the user's documents that contain the phrase."""
+    rng = random.Random(seed)
+    candidates = []
+    for user_id, _, text, _ in docs:
+        for m in _MEAL.finditer(text):
+            candidates.append((user_id, f"how much {m['name'].strip()} did I eat", f" - {m['name']}:"))
+        for m in _WORKOUT.finditer(text):
+            candidates.append((user_id, f"when did I do {m['name'].strip()}", f" - {m['name']}: type="))
+        for m in _BMI.finditer(text):
+            candidates.append((user_id, f"days my BMI was {m['value']}", f"BMI={m['value']},"))
+    candidates = list(dict.fromkeys(candidates))
+    rng.shuffle(candidates)
+
+    by_user: Dict[int, List[Doc]] = {}
+    for doc in docs:
+        by_user.setdefault(doc[0], []).append(doc)
+    queries = []
+    for user_id, query, needle in candidates[:count]:
+        relevant = {doc_id for _, doc_id, text, _ in by_user[user_id] if needle in text}
+        queries.append({"user_id": user_id, "query": query, "relevant": relevant})
+    return queries
+
+
+def load_queries(path: str) -> List[Dict[str, Any]]:
+    from server.mcp_agents.agent_helpers import document_id
+
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                q = json.loads(line)
+                q["relevant"] = {document_id(q["user_id"], day, "daily_summary", section)
+                                 for day in q["relevant"] for section in SECTIONS}
+                queries.append(q)
+    return queries
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def evaluate(queries: List[Dict[str, Any]], mode: str, top_k: int) -> Dict[str, Any]:
+    from server.mcp_agents.agent_helpers import retrieve_user_docs
+
+    hits, recall, rr, latencies = 0, 0.0, 0.0, []
+    retrieve_user_docs(queries[0]["user_id"], queries[0]["query"], top_k=top_k, mode=mode)  # warm
+    for q in queries:
+        started = time.perf_counter()
+        results = retrieve_user_docs(q["user_id"], q["query"], top_k=top_k, mode=mode)
+        latencies.append((time.perf_counter() - started) * 1000)
+        ranked = [r.node.node_id for r in results]
+        relevant: Set[str] = q["relevant"]
+        found = [i for i, node_id in enumerate(ranked) if node_id in relevant]
+        hits += bool(found)
+        recall += len(found) / min(len(relevant), top_k) if relevant else 0.0
+        rr += 1 / (found[0] + 1) if found else 0.0
+    n = len(queries)
+    return {
+        "mode": mode,
+        f"hit@{top_k}": round(hits / n, 4),
+        f"recall@{top_k}": round(recall / n, 4),
+        "mrr": round(rr / n, 4),
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+    }
+
+
+def run(qdrant: str = ":memory:", collection: str = "kb_benchmark", since: Optional[date] = None,
+        until: Optional[date] = None, user_ids=None, limit: int = 1000, query_count: int = 200,
+        queries_file: Optional[str] = None, top_k: int = 4, modes: List[str] = MODES,
+        seed: int = 7) -> Dict[str, Any]:
+    from server.mcp_agents import agent_helpers
+
+    # before the first get_*: never touch the real collection
+    agent_helpers.QDRANT_URL = qdrant
+    agent_helpers.QDRANT_PATH = None
+    agent_helpers.QDRANT_COLLECTION = collection
+
+    started = time.perf_counter()
+    docs = load_documents(since, until, user_ids, limit)
+    if not docs:
+        raise SystemExit("[bench] no documents in range")
+    print(f"[bench] built {len(docs)} documents in {time.perf_counter() - started:.1f}s")
+
+    client = agent_helpers.get_qdrant_client()
+    if qdrant != ":memory:" and client.collection_exists(collection):
+        client.delete_collection(collection)
+        agent_helpers.ensure_collection(client, collection)
+
+    started = time.perf_counter()
+    agent_helpers.index_insert_documents([(u, text, meta) for u, _, text, meta in docs], batch_size=128)
+    index_s = time.perf_counter() - started
+    print(f"[bench] indexed {len(docs)} documents in {index_s:.1f}s ({len(docs) / index_s:.0f} docs/s)")
+
+    queries = load_queries(queries_file) if queries_file else generate_queries(docs, query_count, seed)
+    print(f"[bench] {len(queries)} queries, top_k={top_k}")
+    report = {"documents": len(docs), "queries": len(queries), "index_s": round(index_s, 2), "modes": []}
+    for mode in modes:
+        if agent_helpers.retrieval_mode(mode) != mode:
+            print(f"[bench] {mode}: not available on this collection, skipped")
+            continue
+        result = evaluate(queries, mode, top_k)
+        report["modes"].append(result)
+        print("[bench] " + "  ".join(f"{k}={v}" for k, v in result.items()))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dense / sparse / hybrid knowledge-base retrieval")
+    parser.add_argument("--qdrant", default=":memory:", help='":memory:" (embedded) or a Qdrant URL')
+    parser.add_argument("--collection", default="kb_benchmark", help="throwaway collection (recreated)")
+    parser.add_argument("--since", type=date.fromisoformat)
+    parser.add_argument("--until", type=date.fromisoformat)
+    parser.add_argument("--user", type=int, action="append", dest="user_ids")
+    parser.add_argument("--limit", type=int, default=1000, help="chunks to index")
+    parser.add_argument("--queries", type=int, default=200, help="generated queries")
+    parser.add_argument("--queries-file", help="JSONL of {user_id, query, relevant: [dates]}")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = run(
+        qdrant=args.qdrant, collection=args.collection, since=args.since, until=args.until,
+        user_ids=args.user_ids, limit=args.limit, query_count=args.queries, queries_file=args.queries_file,
+        top_k=args.top_k, modes=args.modes.split(","), seed=args.seed,
+    )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -1,4 +1,6 @@
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
@@ -15,13 +17,37 @@ from server.routes.home import router as food_get
 from server.routes.google_fit import router as google_fit
 from server.routes.sleepLog import router as sleepLog
 from server.routes.water_log import router as water_log
+from server.routes.metrics import router as metrics_router
+from server.services.http_client import close_upstreams
+from server.mcp_agents.mcp_client import mcp_pool
+from server.services.reindex_queue import reindex_queue
+from server.mcp_agents.agent_helpers import KB_WARMUP, warmup as warmup_kb, close_kb
 from sqlalchemy.orm import Session
 from starlette.middleware.sessions import SessionMiddleware
 
 
 load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep MCP sessions open for the life of the app instead of per tool call
+    await mcp_pool.start()
+    # Debounced knowledge-base re-indexing fed by the write routes
+    reindex_queue.start()
+    # The KB (Qdrant client, MiniLM) loads on first use; KB_WARMUP=1 loads it
+    # in the background instead so startup is still immediate
+    if KB_WARMUP:
+        asyncio.create_task(asyncio.to_thread(warmup_kb))
+    yield
+    await reindex_queue.stop()
+    # Drain pooled outbound connections on shutdown
+    await mcp_pool.close()
+    await close_upstreams()
+    close_kb()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # ============================ CORS FIX ============================
 # Define the specific origins (frontend addresses) that are allowed to connect.
@@ -59,6 +85,7 @@ app.include_router(google_fit)
 app.include_router(sleepLog)
 app.include_router(water_log)
 app.include_router(analytics_router)
+app.include_router(metrics_router)
 
 # Middleware to serve the Single Page Application (SPA)
 @app.get("/{full_path:path}")
@@ -1,61 +1,339 @@
+'''
+Knowledge-base helpers: the Qdrant client, vector store, embedding model and
+LlamaIndex index are created lazily on first use (get_* below) and shared by
+the process, so importing this module costs nothing. The app lifespan can
+warm them up ahead of traffic (KB_WARMUP=1) and closes the client on shutdown.
+
+Retrieval is hybrid by default: a dense (MiniLM) search and a sparse BM25
+search (see knowledge_base.hybrid) are fused with reciprocal-rank fusion.
+Collections created before the sparse vector existed cannot gain one, so they
+fall back to dense-only retrieval. To switch one over, point QDRANT_COLLECTION
+at a new name and run the backfill.
+
+QDRANT_URL=":memory:" (or QDRANT_PATH=<dir>) runs Qdrant embedded in the
+process, with no service. This is meant for laptops, tests and
+knowledge_base.retrieval_benchmark.
+'''
 import os
-from typing import List
-from llama_index.core import VectorStoreIndex, StorageContext, Document
-from llama_index.vector_stores.qdrant import QdrantVectorStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from qdrant_client import QdrantClient
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+import uuid
 from uuid import uuid4
-from datetime import date
+from datetime import date, datetime
 
 # Environment variables
 QDRANT_URL = os.environ.get("QDRANT_URL", "http://localhost:6333")
 QDRANT_API_KEY = os.environ.get("QDRANT_API_KEY", None)
+QDRANT_PATH = os.environ.get("QDRANT_PATH")  # embedded on-disk Qdrant (single process)
 QDRANT_COLLECTION = os.environ.get("QDRANT_COLLECTION", "user_kb")
 HF_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DENSE_VECTOR_NAME = "abstract-dense-vector"
+SPARSE_VECTOR_NAME = "bm25-sparse-vector"
+EMBED_DIM = 384  # all-MiniLM-L6-v2
+KB_WARMUP = os.environ.get("KB_WARMUP", "0") == "1"
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")  # hybrid | dense | sparse
+RETRIEVAL_CANDIDATES = int(os.environ.get("RETRIEVAL_CANDIDATES", 20))  # per side, before fusion
+
+# Payload fields retrieval filters on; indexed at bootstrap so a filtered
+# search only visits the matching user's points
+PAYLOAD_INDEXES = {
+    "user_id": "keyword",
+    "type": "keyword",
+    "section": "keyword",
+    "date": "datetime",
+}
+
+
+def ensure_collection(client, collection: Optional[str] = None):
+    """Create the collection if missing and make sure the payload indexes exist (idempotent)."""
+    from qdrant_client import models as qmodels
+
+    collection = collection or QDRANT_COLLECTION
+    if not client.collection_exists(collection):
+        client.create_collection(
+            collection_name=collection,
+            vectors_config={DENSE_VECTOR_NAME: qmodels.VectorParams(size=EMBED_DIM, distance=qmodels.Distance.COSINE)},
+            # documents store BM25 term frequencies; Qdrant applies IDF at query time
+            sparse_vectors_config={SPARSE_VECTOR_NAME: qmodels.SparseVectorParams(modifier=qmodels.Modifier.IDF)},
+        )
+    existing = client.get_collection(collection).payload_schema or {}
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field in existing:
+            continue
+        if field == "user_id":
+            # tenant index: points are co-located per user (Qdrant >= 1.11)
+            try:
+                client.create_payload_index(collection, field, qmodels.KeywordIndexParams(
+                    type=qmodels.KeywordIndexType.KEYWORD, is_tenant=True))
+                continue
+            except Exception:
+                pass
+        client.create_payload_index(collection, field, qmodels.PayloadSchemaType(schema))
+
+
+def has_sparse_vectors(client, collection: Optional[str] = None) -> bool:
+    try:
+        sparse = client.get_collection(collection or QDRANT_COLLECTION).config.params.sparse_vectors or {}
+    except Exception:
+        return False
+    return SPARSE_VECTOR_NAME in sparse
+
+
+def _new_qdrant_client():
+    from qdrant_client import QdrantClient
+
+    if QDRANT_URL == ":memory:":
+        return QdrantClient(location=":memory:")
+    if QDRANT_PATH:
+        return QdrantClient(path=QDRANT_PATH)
+    return QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+
+
+# Process-wide singletons, created on first use
+_lock = threading.RLock()
+_qdrant_client = None
+_qdrant_store = None
+_embed_model = None
+_index = None
+_hybrid = False
+kb_timings = {}
+
+
+def _timed(name: str, factory):
+    started = time.perf_counter()
+    value = factory()
+    kb_timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"[DEBUG] KB {name} ready in {kb_timings[name]} ms")
+    return value
+
+
+def get_qdrant_client():
+    global _qdrant_client
+    if _qdrant_client is None:
+        with _lock:
+            if _qdrant_client is None:
+                client = _timed("qdrant_client", _new_qdrant_client)
+                try:
+                    ensure_collection(client)
+                except Exception as e:
+                    print(f"[WARN] could not bootstrap Qdrant collection {QDRANT_COLLECTION}: {e}")
+                _qdrant_client = client
+    return _qdrant_client
+
+
+def get_vector_store():
+    global _qdrant_store, _hybrid
+    if _qdrant_store is None:
+        with _lock:
+            if _qdrant_store is None:
+                from llama_index.vector_stores.qdrant import QdrantVectorStore
+
+                from server.knowledge_base.hybrid import rrf_fusion, sparse_doc_fn, sparse_query_fn
+
+                client = get_qdrant_client()
+                _hybrid = has_sparse_vectors(client)
+                if not _hybrid:
+                    print(f"[WARN] collection {QDRANT_COLLECTION} has no {SPARSE_VECTOR_NAME}; dense-only retrieval")
+                kwargs = dict(enable_hybrid=True, sparse_vector_name=SPARSE_VECTOR_NAME,
+                              sparse_doc_fn=sparse_doc_fn, sparse_query_fn=sparse_query_fn,
+                              hybrid_fusion_fn=rrf_fusion) if _hybrid else {}
+                _qdrant_store = QdrantVectorStore(client=client,
+                                                  collection_name=QDRANT_COLLECTION,
+                                                  dense_vector_name=DENSE_VECTOR_NAME,
+                                                  **kwargs)
+    return _qdrant_store
+
+
+def load_local_embed_model():
+    """The embedding model in this process (what the sidecar itself serves), behind the embedding cache."""
+    from server.services.embedding_backends import build_embed_model, with_cache
+
+    return with_cache(_timed("embed_model", lambda: build_embed_model(HF_MODEL)))
+
+
+def get_embed_model():
+    """
+    Shared embedding model: a client for the per-host embedding sidecar when
+    EMBEDDING_SOCKET is set (model loaded once per host), else a local model.
+    """
+    global _embed_model
+    if _embed_model is None:
+        with _lock:
+            if _embed_model is None:
+                socket_path = os.environ.get("EMBEDDING_SOCKET")
+                if socket_path:
+                    from server.services.embedding_backends import with_cache
+                    from server.services.embedding_client import SidecarEmbedding
+                    from server.services.embedding_service import EMBED_MAX_BATCH
+
+                    _embed_model = with_cache(SidecarEmbedding(socket_path, embed_batch_size=EMBED_MAX_BATCH))
+                else:
+                    _embed_model = load_local_embed_model()
+    return _embed_model
+
+
+def get_index():
+    """VectorStoreIndex over the existing Qdrant collection (an empty index reuses the store)."""
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                from llama_index.core import StorageContext, VectorStoreIndex
 
-# Single client + vector store for this process
-_qdrant_client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-_qdrant_store = QdrantVectorStore(client=_qdrant_client, 
-                                  collection_name=QDRANT_COLLECTION,
-                                  dense_vector_name="abstract-dense-vector")
-_storage_context = StorageContext.from_defaults(vector_store=_qdrant_store)
-_embed_model = HuggingFaceEmbedding(model_name=HF_MODEL)
+                storage_context = StorageContext.from_defaults(vector_store=get_vector_store())
+                _index = VectorStoreIndex([], storage_context=storage_context, embed_model=get_embed_model())
+    return _index
 
-# Create or reuse an index object (empty index uses existing vector store)
-_index = VectorStoreIndex([], storage_context=_storage_context, embed_model=_embed_model)
+
+def embed_model_id() -> str:
+    """Model + the backend that actually loaded, recorded with each indexed document (see embedding_backends)."""
+    from server.services.embedding_backends import model_backend
+
+    backend = model_backend(get_embed_model())
+    return HF_MODEL if backend == "torch" else f"{HF_MODEL}@{backend}"
+
+
+def warmup():
+    """Create every KB singleton and run one embedding so the first request pays nothing."""
+    get_index()
+    get_embed_model().get_query_embedding("warmup")
+
+
+def embedding_cache_stats():
+    """Embedding cache counters, without loading the model if nothing used it yet."""
+    cache = getattr(_embed_model, "cache", None)
+    return cache.snapshot() if cache is not None else None
+
+
+def close_kb():
+    global _qdrant_client, _qdrant_store, _index
+    with _lock:
+        client, _qdrant_client, _qdrant_store, _index = _qdrant_client, None, None, None
+    if client is not None:
+        try:
+            client.close()
+        except Exception as e:
+            print(f"[WARN] closing Qdrant client: {e}")
+
+
+# Fixed namespace so the same (user, date, type) always maps to the same point id
+DOC_ID_NAMESPACE = uuid.UUID("6f0c7a52-3f0e-4d59-9a51-2c1f3b8e7d10")
+
+
+def document_id(user_id, day, doc_type: str = "daily_summary", section: Optional[str] = None) -> str:
+    """Deterministic Qdrant point id for a user's document of `doc_type` on `day` (or one section of it)."""
+    day = day.isoformat() if hasattr(day, "isoformat") else str(day)
+    key = f"{user_id}:{day}:{doc_type}" + (f":{section}" if section else "")
+    return str(uuid.uuid5(DOC_ID_NAMESPACE, key))
+
+
+def _doc_id_for(user_id: int, metadata: dict) -> str:
+    if metadata.get("doc_id"):
+        return metadata["doc_id"]
+    if metadata.get("date"):
+        return document_id(user_id, metadata["date"], metadata.get("type", "daily_summary"), metadata.get("section"))
+    return str(uuid4())
 
 
 def index_insert_document(user_id: int, doc_text: str, metadata: dict) -> bool:
     """
-    Insert a document (text + metadata) into the index/Qdrant.
-    metadata must include useful tags like type/date/doc_id (optional).
+    Insert or replace a document (text + metadata) in the index/Qdrant.
+    metadata should carry type/date; the point id is derived from
+    (user_id, date, type) unless an explicit doc_id is given, so re-indexing
+    a day overwrites its previous vector instead of appending another one.
     """
-    metadata = metadata.copy()
-    metadata.setdefault("user_id", str(user_id))  # allow caller to provide doc_id to avoid duplicates
-    doc_id = metadata.get("doc_id") or str(uuid4())
-    doc = Document(text=doc_text, metadata=metadata, doc_id=doc_id)
-    
-    _index.insert(doc)
-    
-    try:
-        _index.storage_context.persist()
-    except Exception:
-        # Some setups persist automatically; ignoring persistence error is OK here.
-        pass
-    
-    return True
+    return index_insert_documents([(user_id, doc_text, metadata)]) == 1
 
 
-def retrieve_user_docs(user_id: int, query_type: str, top_k: int = 4) -> List[Document]:
+def index_insert_documents(docs: List[Tuple[int, str, dict]], batch_size: int = 64) -> int:
     """
-    Retrieve top_k documents for the given user and query.
-    Returns LlamaIndex Document-like objects.
+    Bulk version of index_insert_document for (user_id, text, metadata) tuples:
+    texts are embedded in batches of `batch_size` and upserted into Qdrant in
+    batches (same deterministic ids, so existing points are replaced).
+    Returns the number of documents written.
     """
-    
-    retriever = _index.as_retriever(similarity_top_k=top_k)
-    today_str = date.today().isoformat()
-    full_query = f"User {user_id} Date {today_str}: {query_type}"
-    results = retriever.retrieve(full_query)
-    return results
+    from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+
+    written = 0
+    indexed_at = datetime.utcnow().isoformat()
+    for start in range(0, len(docs), batch_size):
+        batch = docs[start:start + batch_size]
+        embeddings = get_embed_model().get_text_embedding_batch([text for _, text, _ in batch])
+        nodes = []
+        for (user_id, text, metadata), embedding in zip(batch, embeddings):
+            metadata = metadata.copy()
+            metadata.setdefault("user_id", str(user_id))
+            metadata["indexed_at"] = indexed_at
+            doc_id = _doc_id_for(user_id, metadata)
+            node = TextNode(id_=doc_id, text=text, metadata=metadata, embedding=embedding)
+            node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=doc_id)
+            nodes.append(node)
+        get_vector_store().add(nodes)
+        written += len(nodes)
+    return written
+
+
+def index_delete_documents(ids: List[str]):
+    """Delete points by id (ids that do not exist are ignored)."""
+    from qdrant_client import models as qmodels
+
+    if ids:
+        get_qdrant_client().delete(QDRANT_COLLECTION, points_selector=qmodels.PointIdsList(points=list(ids)))
+
+
+def embed_query(text: str) -> List[float]:
+    """Embed a query string with the KB embedding model."""
+    return get_embed_model().get_query_embedding(text)
+
 
+def user_docs_filter(user_id: int, since: Optional[date] = None, until: Optional[date] = None,
+                     doc_types: Optional[List[str]] = None, sections: Optional[List[str]] = None):
+    """Qdrant filter restricting a search to one user's documents, optionally by date range, type and section."""
+    from qdrant_client import models as qmodels
 
+    must = [qmodels.FieldCondition(key="user_id", match=qmodels.MatchValue(value=str(user_id)))]
+    if since or until:
+        must.append(qmodels.FieldCondition(key="date", range=qmodels.DatetimeRange(
+            gte=since.isoformat() if since else None,
+            lte=until.isoformat() if until else None,
+        )))
+    if doc_types:
+        must.append(qmodels.FieldCondition(key="type", match=qmodels.MatchAny(any=list(doc_types))))
+    if sections:
+        must.append(qmodels.FieldCondition(key="section", match=qmodels.MatchAny(any=list(sections))))
+    return qmodels.Filter(must=must)
+
+
+def retrieval_mode(mode: Optional[str] = None) -> str:
+    """The effective mode: hybrid/sparse need the collection's sparse vector, else dense."""
+    mode = mode or RETRIEVAL_MODE
+    get_vector_store()
+    return mode if mode == "dense" or _hybrid else "dense"
+
+
+def retrieve_user_docs(user_id: int, query_type: str, top_k: int = 4, query: Optional[str] = None,
+                       since: Optional[date] = None, until: Optional[date] = None,
+                       doc_types: Optional[List[str]] = None, mode: Optional[str] = None,
+                       sections: Optional[List[str]] = None) -> List[Any]:
+    """
+    Retrieve top_k of this user's documents for the query (payload-filtered, so
+    other users' vectors are never scored). Returns LlamaIndex Document-like objects.
+    mode is hybrid (dense + BM25, RRF-fused), dense or sparse; default RETRIEVAL_MODE.
+    sections restricts the search to those daily-document section chunks.
+    """
+    mode = retrieval_mode(mode)
+    kwargs = {"similarity_top_k": top_k}
+    if mode == "hybrid":
+        candidates = max(RETRIEVAL_CANDIDATES, top_k)
+        kwargs = {"similarity_top_k": candidates, "sparse_top_k": candidates, "hybrid_top_k": top_k}
+    elif mode == "sparse":
+        kwargs = {"similarity_top_k": top_k, "sparse_top_k": top_k}
+    retriever = get_index().as_retriever(
+        vector_store_query_mode=mode if mode != "dense" else "default",
+        vector_store_kwargs={"qdrant_filters": user_docs_filter(user_id, since, until, doc_types, sections)},
+        **kwargs,
+    )
+    full_query = f"{query_type}: {query}" if query else query_type
+    results = retriever.retrieve(full_query)
+    return results
@@ -0,0 +1,112 @@
+'''
+Write-through store for api-ninjas exercise results.
+
+Each fetched parameter combination is recorded in ExerciseQuery together with
+the ids of the Exercise rows it returned, so the same query is answered from
+the local table until EXERCISE_DB_TTL_DAYS have passed. Exercise rows that
+already exist (curated or user-created, matched by name) are never
+overwritten; upstream values only fill their empty fields. Functions here are
+blocking (SQLAlchemy); call them through asyncio.to_thread from the MCP server.
+'''
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from server.database import SessionLocal
+from server.models import Exercise, ExerciseQuery
+
+EXERCISE_DB_TTL_DAYS = int(os.getenv("EXERCISE_DB_TTL_DAYS", 30))
+
+DIFFICULTY_LEVELS = {"beginner": 1, "intermediate": 2, "expert": 3}
+DIFFICULTY_NAMES = {v: k for k, v in DIFFICULTY_LEVELS.items()}
+PARAMS_KEY_MAX = 255  # ExerciseQuery.params_key
+
+
+def params_key(name=None, type=None, muscle=None, difficulty=None, offset=0) -> str:
+    parts = [name, type, muscle, difficulty]
+    key = "|".join((p or "").strip().lower() for p in parts) + f"|{int(offset or 0)}"
+    if len(key) > PARAMS_KEY_MAX:
+        # long free-text names: readable prefix + hash of the full key, still unique
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        key = f"{key[:PARAMS_KEY_MAX - len(digest) - 1]}#{digest}"
+    return key
+
+
+def exercise_to_dict(exercise: Exercise) -> Dict[str, Any]:
+    """Same shape as an api-ninjas result, so callers cannot tell where it came from."""
+    muscles = exercise.muscle_groups or []
+    equipment = exercise.equipment_needed or []
+    return {
+        "name": exercise.name,
+        "type": exercise.category,
+        "muscle": muscles[0] if muscles else None,
+        "equipment": equipment[0] if equipment else None,
+        "difficulty": DIFFICULTY_NAMES.get(exercise.difficulty_level),
+        "instructions": exercise.instructions,
+    }
+
+
+def load_cached_query(key: str) -> Optional[List[Dict[str, Any]]]:
+    """Exercises stored for `key`, or None if the combination was never fetched or is stale."""
+    with SessionLocal() as db:
+        query = db.get(ExerciseQuery, key)
+        if query is None or query.fetched_at is None:
+            return None
+        if datetime.utcnow() - query.fetched_at > timedelta(days=EXERCISE_DB_TTL_DAYS):
+            return None
+        ids = query.exercise_ids or []
+        if not ids:
+            return []
+        rows = {e.exercise_id: e for e in db.query(Exercise).filter(Exercise.exercise_id.in_(ids))}
+        if len(rows) != len(ids):
+            return None  # rows were deleted underneath us, refetch
+        return [exercise_to_dict(rows[i]) for i in ids]
+
+
+def _fill(exercise: Exercise, item: Dict[str, Any]):
+    """Set fields from an api-ninjas item, only where the row has no value yet."""
+    values = {
+        "category": item.get("type"),
+        "muscle_groups": [item["muscle"]] if item.get("muscle") else None,
+        "equipment_needed": [item["equipment"]] if item.get("equipment") else None,
+        "instructions": item.get("instructions"),
+        "difficulty_level": DIFFICULTY_LEVELS.get(item.get("difficulty")),
+    }
+    for field, value in values.items():
+        if value is not None and getattr(exercise, field) in (None, "", []):
+            setattr(exercise, field, value)
+
+
+def store_query_results(key: str, items: List[Dict[str, Any]]) -> int:
+    """
+    Insert upstream items missing from Exercise (matched by name), fill empty
+    fields of existing rows, and record the query; returns the row count.
+    """
+    with SessionLocal() as db:
+        names = [item.get("name") for item in items if item.get("name")]
+        existing = {
+            e.name.lower(): e
+            for e in db.query(Exercise).filter(Exercise.name.in_(names))
+        } if names else {}
+
+        ids = []
+        for item in items:
+            name = item.get("name")
+            if not name:
+                continue
+            exercise = existing.get(name.lower())
+            if exercise is None:
+                exercise = Exercise(name=name[:200])
+                db.add(exercise)
+                existing[name.lower()] = exercise
+            _fill(exercise, item)
+        db.flush()
+        for item in items:
+            exercise = existing.get((item.get("name") or "").lower())
+            if exercise is not None and exercise.exercise_id not in ids:
+                ids.append(exercise.exercise_id)
+
+        db.merge(ExerciseQuery(params_key=key, exercise_ids=ids, fetched_at=datetime.utcnow()))
+        db.commit()
+        return len(ids)
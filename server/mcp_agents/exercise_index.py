@@ -0,0 +1,196 @@
+'''
+In-memory bitmap index over the Exercise catalog.
+
+Every exercise gets a position; for each muscle, equipment, category and
+difficulty value the index keeps a Python int whose set bits are the positions
+having that value. A compound filter ("chest AND dumbbell AND difficulty<=2")
+is a handful of big-int ANDs/ORs, i.e. microseconds for catalogs of thousands
+of rows, with no JSON-column scans in the database.
+
+The index is built from the exercises table at MCP server startup and rebuilt
+when the table changes: writes made in-process call `mark_dirty`, and a
+periodic check compares the row count / max id for changes made elsewhere.
+'''
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from server.mcp_agents.exercise_catalog import DIFFICULTY_LEVELS, exercise_to_dict
+
+EXERCISE_INDEX_REFRESH = float(os.getenv("EXERCISE_INDEX_REFRESH", 60))
+
+FIELDS = ("muscle", "equipment", "category", "difficulty")
+
+Values = Union[None, str, int, Iterable[Any]]
+
+
+def _norm(value: Any) -> str:
+    return str(value).strip().lower().replace(" ", "_")
+
+
+def _as_list(values: Values) -> List[Any]:
+    if values is None:
+        return []
+    if isinstance(values, (str, int)):
+        return [values]
+    return list(values)
+
+
+class ExerciseIndex:
+    def __init__(self):
+        self.docs: List[Dict[str, Any]] = []
+        self.bitmaps: Dict[str, Dict[Any, int]] = {f: {} for f in FIELDS}
+        self.all_bits = 0
+        self.signature: Optional[Tuple[int, int]] = None
+        self.built_at = 0.0
+        self.build_ms = 0.0
+        self._dirty = True
+        self._lock = threading.Lock()
+
+    def build(self, rows: Iterable[Any]):
+        """Rebuild from Exercise rows; swaps the structures in atomically."""
+        started = time.perf_counter()
+        docs: List[Dict[str, Any]] = []
+        bitmaps: Dict[str, Dict[Any, int]] = {f: {} for f in FIELDS}
+
+        def add(field, value, bit):
+            bitmaps[field][value] = bitmaps[field].get(value, 0) | bit
+
+        for pos, row in enumerate(rows):
+            bit = 1 << pos
+            docs.append({"exercise_id": row.exercise_id, **exercise_to_dict(row)})
+            for muscle in row.muscle_groups or []:
+                add("muscle", _norm(muscle), bit)
+            for equipment in row.equipment_needed or []:
+                add("equipment", _norm(equipment), bit)
+            if row.category:
+                add("category", _norm(row.category), bit)
+            if row.difficulty_level is not None:
+                add("difficulty", int(row.difficulty_level), bit)
+
+        with self._lock:
+            self.docs, self.bitmaps = docs, bitmaps
+            self.all_bits = (1 << len(docs)) - 1
+            self.built_at = time.time()
+            self.build_ms = round((time.perf_counter() - started) * 1000, 2)
+            self._dirty = False
+
+    def _union(self, field: str, values: List[Any]) -> int:
+        postings = self.bitmaps[field]
+        bits = 0
+        for value in values:
+            bits |= postings.get(value if field == "difficulty" else _norm(value), 0)
+        return bits
+
+    def match(
+        self,
+        muscle: Values = None,
+        equipment: Values = None,
+        category: Values = None,
+        difficulty: Values = None,
+        max_difficulty: Optional[int] = None,
+        min_difficulty: Optional[int] = None,
+    ) -> int:
+        """
+        Bitmap of matching positions. Values within a field are ORed, fields are
+        ANDed; difficulty accepts levels (1-3) or names (beginner/intermediate/expert).
+        """
+        with self._lock:
+            return self._match(muscle, equipment, category, difficulty, max_difficulty, min_difficulty)
+
+    def _match(self, muscle: Values = None, equipment: Values = None, category: Values = None,
+               difficulty: Values = None, max_difficulty: Optional[int] = None,
+               min_difficulty: Optional[int] = None) -> int:
+        # caller holds self._lock
+        bits = self.all_bits
+        for field, values in (("muscle", muscle), ("equipment", equipment), ("category", category)):
+            values = _as_list(values)
+            if values:
+                bits &= self._union(field, values)
+        requested = _as_list(difficulty)
+        levels = [DIFFICULTY_LEVELS.get(_norm(v), v) for v in requested]
+        levels = [int(v) for v in levels if str(v).isdigit()]
+        if requested and not levels:
+            return 0  # only unknown difficulty names: match nothing rather than drop the filter
+        if max_difficulty is not None or min_difficulty is not None:
+            lo = min_difficulty if min_difficulty is not None else 0
+            hi = max_difficulty if max_difficulty is not None else 1 << 30
+            levels = [lvl for lvl in (levels or self.bitmaps["difficulty"]) if lo <= lvl <= hi]
+            if not levels:
+                return 0
+        if levels:
+            bits &= self._union("difficulty", levels)
+        return bits
+
+    def search(self, name: Optional[str] = None, limit: int = 10, offset: int = 0, **filters) -> List[Dict[str, Any]]:
+        # bits and docs from the same build: a concurrent rebuild swaps both
+        with self._lock:
+            bits = self._match(**filters)
+            docs = self.docs
+        needle = name.strip().lower() if name else None
+        results, skipped = [], 0
+        while bits and len(results) < limit:
+            low = bits & -bits
+            doc = docs[low.bit_length() - 1]
+            bits ^= low
+            if needle and needle not in (doc["name"] or "").lower():
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            results.append(doc)
+        return results
+
+    def count(self, **filters) -> int:
+        return bin(self.match(**filters)).count("1")
+
+    def mark_dirty(self):
+        self._dirty = True
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "exercises": len(self.docs),
+            "values": {field: len(postings) for field, postings in self.bitmaps.items()},
+            "built_at": self.built_at or None,
+            "build_ms": self.build_ms,
+            "dirty": self._dirty,
+        }
+
+
+exercise_index = ExerciseIndex()
+
+
+def _table_signature(db) -> Tuple[int, int]:
+    from sqlalchemy import func
+    from server.models import Exercise
+
+    count, max_id = db.query(func.count(Exercise.exercise_id), func.max(Exercise.exercise_id)).one()
+    return int(count or 0), int(max_id or 0)
+
+
+def refresh_exercise_index(force: bool = False) -> bool:
+    """Rebuild the index from the exercises table if it changed; returns True when rebuilt."""
+    from server.database import SessionLocal
+    from server.models import Exercise
+
+    with SessionLocal() as db:
+        signature = _table_signature(db)
+        if not force and not exercise_index._dirty and signature == exercise_index.signature:
+            return False
+        rows = db.query(Exercise).order_by(Exercise.exercise_id).all()
+        exercise_index.build(rows)
+        exercise_index.signature = signature
+    print(f"[DEBUG] exercise index rebuilt: {exercise_index.snapshot()}")
+    return True
+
+
+async def run_index_refresher(interval: float = EXERCISE_INDEX_REFRESH):
+    """Background loop for the MCP server: build once, then poll for catalog changes."""
+    while True:
+        try:
+            await asyncio.to_thread(refresh_exercise_index)
+        except Exception as e:
+            print(f"[WARN] exercise index refresh failed: {e}")
+        await asyncio.sleep(interval)
@@ -1,26 +1,186 @@
+'''
+Long-lived MCP client pool.
+
+The app lifespan opens MCP_POOL_SIZE sessions to the MCP server once and keeps
+them open; tool calls are spread round-robin across them, so a call costs a
+single round trip instead of connect + list_tools + call_tool.
+
+The tool registry is loaded when a session connects and refreshed when the
+server announces a tool list change, or when a call names a tool the registry
+does not know yet. A session that fails at the transport level is reconnected
+and the call retried once.
+'''
+import asyncio
+import itertools
+import os
+import time
+from typing import Any, Dict, List, Optional
+
 from fastmcp.client import Client
-from fastmcp.client.transports import WSTransport,StreamableHttpTransport
+from fastmcp.client.transports import StreamableHttpTransport
+from fastmcp.exceptions import ToolError
+from server.services.http_client import UpstreamMetrics, get_upstream
+
+try:
+    from fastmcp.client.messages import MessageHandler
+except ImportError:  # older fastmcp: no list_changed hook, unknown tools still trigger a refresh
+    MessageHandler = None
+
+MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://localhost:8004/mcp")  # MCP server URL
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", 2))
+MCP_AUTH_TOKEN = os.getenv("MCP_AUTH_TOKEN")  # must match the MCP server's
+
+
+class _PooledSession:
+    def __init__(self, pool: "MCPClientPool", index: int):
+        self.pool = pool
+        self.index = index
+        self.client: Optional[Client] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self.client is not None and self.client.is_connected()
+
+    async def ensure_connected(self) -> Client:
+        if self.connected:
+            return self.client
+        async with self._lock:
+            if self.connected:
+                return self.client
+            await self._close()
+            kwargs = {"message_handler": self.pool.message_handler} if self.pool.message_handler else {}
+            headers = {"Authorization": f"Bearer {MCP_AUTH_TOKEN}"} if MCP_AUTH_TOKEN else None
+            client = Client(transport=StreamableHttpTransport(self.pool.url, headers=headers),
+                            name="fitness-data", **kwargs)
+            await client.__aenter__()
+            self.client = client
+            self.pool.connects += 1
+            print(f"[DEBUG] MCP session {self.index} connected to {self.pool.url}")
+            if not self.pool.tools:
+                await self.pool.refresh_tools(client)
+            return client
+
+    async def reset(self):
+        async with self._lock:
+            await self._close()
+
+    async def _close(self):
+        client, self.client = self.client, None
+        if client is not None:
+            try:
+                await client.__aexit__(None, None, None)
+            except Exception as e:
+                print(f"[WARN] closing MCP session {self.index}: {e}")
+
+
+if MessageHandler is not None:
+    class _ToolListHandler(MessageHandler):
+        def __init__(self, pool: "MCPClientPool"):
+            super().__init__()
+            self.pool = pool
+
+        async def on_tool_list_changed(self, notification):
+            self.pool.mark_tools_stale()
+
+
+class MCPClientPool:
+    def __init__(self, url: str = MCP_SERVER_URL, size: int = MCP_POOL_SIZE):
+        self.url = url
+        self.sessions = [_PooledSession(self, i) for i in range(max(size, 1))]
+        self._next = itertools.cycle(self.sessions)
+        self.message_handler = _ToolListHandler(self) if MessageHandler is not None else None
+        self.tools: Dict[str, Any] = {}
+        self.tools_loaded_at = 0.0
+        self._tools_stale = False
+        self._refresh_lock = asyncio.Lock()
+        self.tool_metrics: Dict[str, UpstreamMetrics] = {}
+        self.connects = 0
+        self.reconnects = 0
+        self.registry_refreshes = 0
+
+    async def start(self):
+        """Open the first session and load the tool registry; a down MCP server is not fatal."""
+        try:
+            await self.sessions[0].ensure_connected()
+        except Exception as e:
+            print(f"[WARN] MCP server not reachable at startup ({e}); will connect on first call")
+
+    async def close(self):
+        for session in self.sessions:
+            await session.reset()
+
+    def mark_tools_stale(self):
+        self._tools_stale = True
+
+    async def refresh_tools(self, client: Client):
+        async with self._refresh_lock:
+            tools = await client.list_tools()
+            self.tools = {t.name: t for t in tools}
+            self.tools_loaded_at = time.time()
+            self._tools_stale = False
+            self.registry_refreshes += 1
+            print(f"[DEBUG] MCP tool registry: {sorted(self.tools)}")
+
+    def list_tools(self) -> List[str]:
+        return sorted(self.tools)
+
+    async def _call_once(self, session: _PooledSession, tool_name: str, arguments: Dict[str, Any]):
+        client = await session.ensure_connected()
+        if self._tools_stale or tool_name not in self.tools:
+            await self.refresh_tools(client)
+            if tool_name not in self.tools:
+                raise ValueError(f"Tool '{tool_name}' not found. Available: {self.list_tools()}")
+        return await client.call_tool(tool_name, arguments=arguments)
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]):
+        session = next(self._next)
+        metrics = self.tool_metrics.setdefault(tool_name, UpstreamMetrics())
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            try:
+                return await self._call_once(session, tool_name, arguments)
+            except (ToolError, ValueError):
+                raise
+            except Exception as e:
+                # broken transport/session: reconnect and retry once
+                print(f"[WARN] MCP session {session.index} failed ({type(e).__name__}: {e}); reconnecting")
+                self.reconnects += 1
+                await session.reset()
+                return await self._call_once(session, tool_name, arguments)
+        except Exception as e:
+            outcome = type(e).__name__
+            metrics.errors += 1
+            raise
+        finally:
+            metrics.observe((time.perf_counter() - started) * 1000, outcome)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "sessions": len(self.sessions),
+            "connected": sum(s.connected for s in self.sessions),
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "registry_refreshes": self.registry_refreshes,
+            "tools": self.list_tools(),
+            "tools_loaded_at": self.tools_loaded_at or None,
+            "per_tool": {name: m.snapshot() for name, m in self.tool_metrics.items()},
+        }
+
+
+mcp_pool = MCPClientPool()
+
+# tools without side effects; a failed call is retried once (UPSTREAM_CONFIGS["mcp"].retries)
+READ_ONLY_TOOLS = {"get_excercises", "search_exercises", "get_recent_summary"}
 
-MCP_SERVER_URL = "http://localhost:8004/mcp"  # MCP server URL
 
 async def call_mcp_tool(tool_name: str, **kwargs):
     """
-    Call a tool exposed by the MCP server using FastMCP (v2.12.4).
+    Call a tool exposed by the MCP server over a pooled, already-open session.
+    Runs under the shared "mcp" upstream's timeout, breaker and metrics;
+    READ_ONLY_TOOLS are retried with backoff.
     """
-    transport = StreamableHttpTransport(MCP_SERVER_URL)
-    
-    # Initialize and connect the MCP client
-    async with Client(transport=transport, name="fitness-data") as client:
-        await client._connect()
-        
-        # Get the available tools
-        tools_response = await client.list_tools()
-        available_tools = [t.name for t in tools_response]
-        
-        if tool_name not in available_tools:
-            raise ValueError(f"Tool '{tool_name}' not found. Available: {available_tools}")
-        
-        # Call the MCP tool with given params
-        result = await client.call_tool(tool_name,arguments=kwargs)
-        return result
-
+    return await get_upstream("mcp").call(lambda: mcp_pool.call_tool(tool_name, kwargs),
+                                          retry=tool_name in READ_ONLY_TOOLS)
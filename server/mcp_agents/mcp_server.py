@@ -3,22 +3,78 @@ MCP server containing various external tools to provide more context to user que
 '''
 from fastmcp import FastMCP
 
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 import os
-import requests
+import httpx
 import asyncio
+import hmac
+import time
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse
+from server.services.http_client import get_upstream, CircuitOpenError
+from server.mcp_agents.exercise_catalog import params_key, load_cached_query, store_query_results
+from server.mcp_agents.exercise_index import exercise_index, run_index_refresher
+from server.knowledge_base.recent_summary import get_recent_summary as fetch_recent_summary
+from server.database import SessionLocal
 load_dotenv()
 
 mcp=FastMCP("external_tools_mcp")
 
+# tools return user data keyed by a caller-supplied user_id, so only the API
+# may call them: loopback by default, and a shared bearer token when set
+MCP_HOST=os.getenv("MCP_HOST","127.0.0.1")
+MCP_PORT=int(os.getenv("MCP_PORT",8004))
+MCP_AUTH_TOKEN=os.getenv("MCP_AUTH_TOKEN")
+
+
+class SharedSecretAuth:
+    """ASGI middleware rejecting HTTP requests without `Authorization: Bearer <MCP_AUTH_TOKEN>`."""
+
+    def __init__(self, app, token: str):
+        self.app = app
+        self.expected = f"Bearer {token}".encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            supplied = dict(scope.get("headers") or []).get(b"authorization", b"")
+            if not hmac.compare_digest(supplied, self.expected):
+                await JSONResponse({"error": "unauthorized"}, status_code=401)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
 
 
 #tool for planning workout session for users a/c to their daily habits
 EXCERCISE_API_KEY=os.getenv("EXCERCISE_API_KEY")
-API_URL="https://api.api-ninjas.com/v1/exercises"
+API_PATH="/v1/exercises"
+EXERCISE_CACHE_TTL=float(os.getenv("EXERCISE_CACHE_TTL", 3600))
+EXERCISE_CACHE_SIZE=512
+
+# params_key -> (expires_at, exercises); in front of the exercises table
+_exercise_cache: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+exercise_stats = {"memory": 0, "table": 0, "upstream": 0, "errors": 0}
+
+
+def _cache_get(key: str) -> Optional[List[Dict[str, Any]]]:
+    entry = _exercise_cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        del _exercise_cache[key]
+        return None
+    return entry[1]
+
+
+def _cache_put(key: str, data: List[Dict[str, Any]]):
+    if len(_exercise_cache) >= EXERCISE_CACHE_SIZE:
+        # drop the entry closest to expiry
+        del _exercise_cache[min(_exercise_cache, key=lambda k: _exercise_cache[k][0])]
+    _exercise_cache[key] = (time.monotonic() + EXERCISE_CACHE_TTL, data)
+
+
 @mcp.tool()
-def get_excercises(
+async def get_excercises(
     name:str=None,
     type:str=None,
     muscle:str=None,
@@ -26,6 +82,27 @@ def get_excercises(
     offset:int=0,
     limit:int=5
 )->List[Dict[str,Any]]:
+    """
+    Exercises matching the filters. Answered from the in-memory TTL cache, then
+    the local exercises table; api-ninjas is only called for combinations not
+    seen before, and its results are written through to the table.
+    """
+    key=params_key(name, type, muscle, difficulty, offset)
+    data=_cache_get(key)
+    if data is not None:
+        exercise_stats["memory"]+=1
+        return data[:limit]
+
+    try:
+        data=await asyncio.to_thread(load_cached_query, key)
+    except Exception as e:
+        print(f"[WARN] exercise table lookup failed: {e}")
+        data=None
+    if data is not None:
+        exercise_stats["table"]+=1
+        _cache_put(key, data)
+        return data[:limit]
+
     params={
         "name":name,
         "type":type,
@@ -37,16 +114,76 @@ def get_excercises(
     headers={"X-Api-Key":EXCERCISE_API_KEY}
 
     try:
-        response=requests.get(API_URL,headers=headers,params=params)
+        response=await get_upstream("api_ninjas").get(API_PATH,headers=headers,params=params)
         response.raise_for_status()
         data=response.json()
-        return data[:limit]
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        exercise_stats["errors"]+=1
         return {"error":str(e)}
+
+    exercise_stats["upstream"]+=1
+    _cache_put(key, data)
+    try:
+        await asyncio.to_thread(store_query_results, key, data)
+        exercise_index.mark_dirty()
+    except Exception as e:
+        print(f"[WARN] could not write exercises through to the table: {e}")
+    return data[:limit]
     
 
-if __name__=="__main__":
-    print("mpc server is ready")
-    asyncio.run(mcp.run_http_async(host="0.0.0.0",port=8004))
+@mcp.tool()
+async def search_exercises(
+    muscle:List[str]=None,
+    equipment:List[str]=None,
+    category:List[str]=None,
+    difficulty:List[str]=None,
+    max_difficulty:int=None,
+    name:str=None,
+    offset:int=0,
+    limit:int=5
+)->List[Dict[str,Any]]:
+    """
+    Search the local exercise catalog without calling any external API.
+    Values within a filter are ORed, filters are ANDed, e.g. muscle=["chest"],
+    equipment=["dumbbell"], max_difficulty=2. Difficulty levels: 1 beginner,
+    2 intermediate, 3 expert.
+    """
+    return exercise_index.search(
+        name=name, limit=limit, offset=offset,
+        muscle=muscle, equipment=equipment, category=category,
+        difficulty=difficulty, max_difficulty=max_difficulty,
+    )
 
 
+@mcp.tool()
+async def get_recent_summary(user_id:int, days:int=7)->Dict[str,Any]:
+    """
+    The user's own tracking data for the last `days` days (max 31): per-day
+    calories and macros, water, sleep hours/quality and workouts, averages,
+    and the active goal's targets.
+    """
+    def load():
+        with SessionLocal() as db:
+            return fetch_recent_summary(db, user_id, days)
+
+    try:
+        return await asyncio.to_thread(load)
+    except Exception as e:
+        return {"error":str(e)}
+
+
+async def main():
+    # the refresher builds the index right away, then keeps it in step with the table
+    refresher=asyncio.create_task(run_index_refresher())
+    try:
+        middleware=[Middleware(SharedSecretAuth, token=MCP_AUTH_TOKEN)] if MCP_AUTH_TOKEN else None
+        if not MCP_AUTH_TOKEN and MCP_HOST not in ("127.0.0.1","localhost","::1"):
+            print(f"[WARN] MCP server listening on {MCP_HOST} without MCP_AUTH_TOKEN")
+        await mcp.run_http_async(host=MCP_HOST,port=MCP_PORT,middleware=middleware)
+    finally:
+        refresher.cancel()
+
+
+if __name__=="__main__":
+    print("mpc server is ready")
+    asyncio.run(main())
@@ -2,7 +2,7 @@ from sqlalchemy import Column, Integer, String, Date, JSON,DECIMAL, ForeignKey,D
 from sqlalchemy.orm import relationship
 from server.database import Base
 from datetime import datetime,timezone
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Index
 # from pgvector.sqlalchemy import Vector
 import enum
 
@@ -116,6 +116,14 @@ class Exercise(Base):
     
     workout_exercises = relationship("WorkoutExercise", back_populates="exercise")
 
+class ExerciseQuery(Base):
+    """api-ninjas parameter combinations already fetched into the exercises table"""
+    __tablename__ = "exercise_queries"
+
+    params_key = Column(String(255), primary_key=True)  # "name|type|muscle|difficulty|offset"
+    exercise_ids = Column(JSON)  # ordered as the upstream returned them
+    fetched_at = Column(DateTime, default=datetime.utcnow)
+
 class WorkoutExercise(Base):
     __tablename__ = "workout_exercises"
     
@@ -266,10 +274,15 @@ class ChatMessage(Base):
     session_id = Column(Integer, ForeignKey("chat_sessions.session_id"))
     role = Column(String(20))  # "user" or "assistant"
     content = Column(Text)
+    intent = Column(String(50), nullable=True)  # classified intent of user messages
+    intent_source = Column(String(20), nullable=True)  # who labelled it: rule | local | llm | human
     timestamp = Column(DateTime, default=datetime.utcnow)
 
     session = relationship("ChatSession", back_populates="messages")
 
+    # keyset pagination and last-message lookups per session
+    __table_args__ = (Index("ix_chat_messages_session_timestamp", "session_id", "timestamp"),)
+
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
     
@@ -279,10 +292,16 @@ class ChatSession(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = Column(Boolean, default=True)
+    # rolling summary of turns older than the recent window, up to summary_message_id
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
     
     user = relationship("User", back_populates="chat_sessions")
     messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
 
+    # session drawer: a user's sessions by recent activity
+    __table_args__ = (Index("ix_chat_sessions_user_updated", "user_id", "updated_at"),)
+
 class UserEmbeddingsCache(Base):
     __tablename__="user_embeddings_cache"
     id = Column(Integer, primary_key=True, index=True)
@@ -1,22 +1,51 @@
 # routes/api.py
 import uuid
-from datetime import datetime,date
+import json
+import re
+from datetime import datetime,date,timedelta
 from typing import Optional, List, Dict
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-import hashlib
-from sqlalchemy.dialects.postgresql import insert
-from server.database import get_db
+from sqlalchemy import select, tuple_, true
+import base64
+from server.database import get_db, SessionLocal
 from server.models import ChatMessage,ChatSession,UserEmbeddingsCache
-from server.mcp_agents.agent_helpers import retrieve_user_docs,index_insert_document
-from server.services.llm_helper import query_llm,infer_excercise_params,query_llm_intent
+from server.mcp_agents.agent_helpers import retrieve_user_docs
+from server.services.llm_helper import query_llm,query_llm_stream,query_llm_intent,FALLBACK_RESPONSE
 from server.auth import get_current_user
-from server.knowledge_base.document_builder import build_daily_document
-from server.knowledge_base.extractor import get_user_daily_data
 from server.mcp_agents.mcp_client import call_mcp_tool
+from server.services.stage_graph import StageGraph
+from server.services.intent_classifier import INTENTS, classify_intent_local
+from server.services.response_cache import get_response_cache, is_cacheable
+from server.services.context_builder import schedule_summary_refresh
+from server.services.exercise_params import infer_exercise_params, catalog_filters
+from server.services.reindex_queue import enqueue_reindex
 
 router = APIRouter(prefix="/api", tags=["Chat"])
+
+# intents answered with the user's own recent numbers (get_recent_summary MCP tool):
+# always for daily_summary; nutrition/sleep questions only when they refer to the
+# user's own data, so generic ones stay tool-free and hit the response cache
+USER_DATA_INTENTS = {"nutrition_advice", "sleep_advice"}
+OWN_DATA_PATTERN = re.compile(
+    r"\b(my|me|mine|i've|i'm|i (?:ate|slept|drank|had|did|logged)|(?:did|have|am) i|"
+    r"today|tonight|yesterday|last night|this week|last week|lately|recently)\b",
+    re.I,
+)
+RECENT_SUMMARY_DAYS = 7
+# only this user's daily documents from the last RETRIEVAL_DAYS are searched
+RETRIEVAL_DAYS = 30
+# daily-document sections (document_builder.SECTIONS) each intent retrieves;
+# intents not listed search every section
+INTENT_SECTIONS = {
+    "nutrition_advice": ["nutrition", "hydration", "body"],
+    "sleep_advice": ["sleep"],
+    "training_suggestion": ["workouts", "body", "profile"],
+    "fitness_tips": ["workouts", "body", "profile"],
+}
 # Pydantic models
 class StartSessionResponse(BaseModel):
     session_id: int
@@ -24,7 +53,7 @@ class StartSessionResponse(BaseModel):
     created_at: datetime
 
 class ChatRequest(BaseModel):
-    user_id: int
+    user_id: int  # kept for clients; the authenticated user is what counts
     message: str
     session_id: Optional[int] = None
     require_retrieval: Optional[bool] = False
@@ -35,17 +64,30 @@ class ChatResponse(BaseModel):
     assistant_message: str
     retrieved_docs: List[Dict]
     timestamp: datetime
+    timings: Optional[Dict[str, float]] = None
 
-class UserEmbeddingsCacheRead(BaseModel):
+class SessionListItem(BaseModel):
+    session_id: int
+    title: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    last_message: Optional[str] = None
+    last_message_role: Optional[str] = None
+    last_message_at: Optional[datetime] = None
+
+class SessionPage(BaseModel):
+    items: List[SessionListItem]
+    next_cursor: Optional[str] = None
+
+class MessageItem(BaseModel):
     id: int
-    user_id: int
-    date: date
-    doc_hash: str
-    doc_metadata: Optional[Dict] = None
-    last_indexed: datetime
+    role: str
+    content: str
+    timestamp: datetime
 
-    class Config:
-        orm_mode = True
+class MessagePage(BaseModel):
+    items: List[MessageItem]
+    next_cursor: Optional[str] = None
 
 
 async def classify_intent_llm(message: str) -> str:
@@ -58,7 +100,8 @@ async def classify_intent_llm(message: str) -> str:
     Return only the intent as a single word.
     """
     intent = await query_llm_intent(user_message=prompt)
-    return intent.strip()
+    intent = intent.strip().strip(".\"'`").lower()
+    return intent if intent in INTENTS else "general"
 
 def classify_intent_rule_based(message:str)->Optional[str]:
     msg = message.lower()
@@ -77,28 +120,6 @@ def get_existing_embedding_entry(db: Session, user_id: int, target_date: date):
     ).first())
 
 
-def upsert_embedding_entry(db: Session, user_id: int, target_date: date, doc_hash: str, doc_metadata: Optional[Dict]):
-    stmt=insert(UserEmbeddingsCache).values(
-        user_id=user_id,
-        date=target_date,
-        doc_hash=doc_hash,
-        doc_metadata=doc_metadata,
-        last_indexed=datetime.utcnow(),
-    )
-    stmt=stmt.on_conflict_do_update(
-        index_elements=['user_id','date'],
-        set_={
-            "doc_hash":doc_hash,
-            "doc_metadata":doc_metadata,
-            "last_indexed":datetime.utcnow(),
-        },
-    )
-    result=db.execute(stmt)
-    db.commit()
-    entry=(db.query(UserEmbeddingsCache).filter_by(user_id=user_id,date=target_date).first())
-    return entry
-
-
 ###### Routes
 @router.post("/start_session", response_model=StartSessionResponse)
 def start_session(user_id: int, db: Session = Depends(get_db)):
@@ -112,132 +133,427 @@ def start_session(user_id: int, db: Session = Depends(get_db)):
         created_at=new_session.created_at
     )
 
-@router.post("/build_embed", response_model=UserEmbeddingsCacheRead)
+@router.post("/build_embed", status_code=202)
 def build_and_index_daily_document(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user),
 ):
-    try:
-        target_date = date.today()
-        # Fetch user daily data
-        user_data = get_user_daily_data(target_date, db=db, current_user=current_user)
-        if not user_data or not user_data.get("user"):
-            raise HTTPException(status_code=404, detail="No daily data found for this user.")
-
-        # Build the document
-        document = build_daily_document(user_data, target_date)
-        doc_text = document.get("text", "")
-        metadata = document.get("metadata", {})
-
-        if not doc_text.strip():
-            raise HTTPException(status_code=400, detail="Empty daily data")
-
-        # Compute hash
-        doc_hash = hashlib.sha256(doc_text.encode("utf-8")).hexdigest()
-
-        # # Check cache
-        existing_entry = get_existing_embedding_entry(db, current_user.user_id, target_date)
-        if existing_entry and existing_entry.doc_hash == doc_hash:
-            print("entry already exists")
-            existing_entry.doc_metadata["type"]="cached"
-            db.commit()
-            db.refresh(existing_entry)
-            return existing_entry
-        
-        # Insert into vector store
-        success = index_insert_document(user_id=current_user.user_id, doc_text=doc_text, metadata=metadata)
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to insert document into index")
-        
-        # Upsert cache entry
-        entry = upsert_embedding_entry(db, current_user.user_id, target_date, doc_hash, metadata)
-        print(f"Indexed new document for user {current_user.user_id} date {target_date}")
-
-        return entry
+    """
+    Queue today's document for (re)indexing and return immediately. Embedding
+    happens in the reindex workers, and only if the document changed; the write
+    routes keep it fresh the rest of the time.
+    """
+    target_date = date.today()
+    enqueue_reindex(current_user.user_id, target_date, delay=0)
+    existing_entry = get_existing_embedding_entry(db, current_user.user_id, target_date)
+    return {
+        "status": "queued",
+        "user_id": current_user.user_id,
+        "date": target_date,
+        "last_indexed": existing_entry.last_indexed if existing_entry else None,
+    }
+
+
+async def _prepare_turn(req: ChatRequest, db: Session, current_user):
+    """
+    Everything a chat turn needs before the final LLM call, run as a stage graph:
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Error building daily document: {str(e)}")
+        session -> history              (reads only, then the DB connection is released)
+        intent -> tool                  (exercises for training_suggestion, the user's
+                                         recent numbers for daily_summary and for
+                                         USER_DATA_INTENTS about the user's own data)
+        intent -> retrieval             (require_retrieval only)
 
+    Nothing is written here: the session, user message and assistant message are
+    persisted together by _persist_turn once the answer exists, so no pooled
+    connection is held across LLM/tool/retrieval work.
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(req: ChatRequest, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    try:
-        # Load or create chat session
-        if req.session_id:
-            session = db.query(ChatSession).filter(ChatSession.session_id == req.session_id).first()
-            if not session:
-                raise HTTPException(status_code=404, detail="Session not found")
+    User data is always read for the authenticated user, never req.user_id.
+    """
+    started_at = datetime.utcnow()
+    user_id = current_user.user_id
+    intent_source = {"value": None}
+
+    async def load_session(results):
+        # Existing session, or None for a new one (created when the turn is persisted)
+        if not req.session_id:
+            return None
+        session = db.query(ChatSession).filter(
+            ChatSession.session_id == req.session_id,
+            ChatSession.user_id == user_id,  # another user's session is "not found"
+        ).first()
+        if not session:
+            db.close()
+            raise HTTPException(status_code=404, detail="Session not found")
+        return session
+
+    async def load_history(results):
+        # Every message not yet folded into the session summary, so nothing falls
+        # between the two while a fold is pending (at most RECENT_WINDOW +
+        # SUMMARY_BATCH - 1 of them; build_prompt trims to the token budget).
+        # The current message is added to the prompt separately.
+        session = results["session"]
+        history = []
+        if session is not None:
+            history = (
+                db.query(ChatMessage)
+                .filter(ChatMessage.session_id == session.session_id, ChatMessage.id > (session.summary_message_id or 0))
+                .order_by(ChatMessage.id)
+                .all()
+            )
+        chat_history = [{"role": m.role, "content": m.content} for m in history]
+        # Last read of the turn: hand the connection back to the pool. Loaded
+        # objects stay usable (close() expunges without expiring them).
+        db.close()
+        return chat_history
+
+    async def classify(results):
+        # keywords, then the local classifier; the LLM only when both are unsure.
+        # The source is stored with the label so retraining can skip our own guesses.
+        for source, classifier in (("rule", classify_intent_rule_based), ("local", classify_intent_local)):
+            intent = classifier(req.message)
+            if intent:
+                break
         else:
-            session = ChatSession(user_id=req.user_id, title="New Chat")
+            source, intent = "llm", await classify_intent_llm(req.message)
+        intent_source["value"] = source
+        print(f"[DEBUG] Classified intent: {intent} ({source})")
+        return intent
+
+    async def run_tool(results):
+        if results["intent"] == "daily_summary" or (
+                results["intent"] in USER_DATA_INTENTS and OWN_DATA_PATTERN.search(req.message)):
+            # exact recent numbers from the rollup tables instead of fuzzy retrieval
+            return await call_mcp_tool("get_recent_summary", user_id=user_id, days=RECENT_SUMMARY_DAYS)
+        if results["intent"] != "training_suggestion":
+            return None
+        inferred_params = await infer_exercise_params(req.message)
+        print(f"inferred_params:{inferred_params}")
+        # local catalog index first; api-ninjas only when it has nothing for these filters
+        workouts = await call_mcp_tool("search_exercises", **catalog_filters(inferred_params))
+        if not (workouts.structured_content or {}).get("result"):
+            workouts = await call_mcp_tool("get_excercises", **inferred_params)
+        print(f"[DEBUG] MCP workouts: {workouts.structured_content}")
+        return workouts
+
+    async def retrieve(results):
+        if not req.require_retrieval:
+            return []
+        sections = INTENT_SECTIONS.get(results["intent"])
+        retrieved = await run_in_threadpool(
+            retrieve_user_docs, user_id, results["intent"], top_k=2 if sections else 4,
+            query=req.message, since=date.today() - timedelta(days=RETRIEVAL_DAYS), sections=sections,
+        )
+        return [
+            {"text": getattr(d, "text", str(d)), "metadata": getattr(d, "metadata", {})}
+            for d in retrieved
+        ]
+
+    graph = (
+        StageGraph("chat")
+        .stage("session", load_session)
+        .stage("intent", classify)
+        .stage("history", load_history, deps=["session"])
+        .stage("tool", run_tool, deps=["intent"])
+        .stage("retrieval", retrieve, deps=["intent"])
+    )
+    results, timings = await graph.run()
+    print(f"[TIMING] chat stages (ms): {timings}")
+
+    session = results["session"]
+    return {
+        "user_id": user_id,
+        "session": session,
+        "started_at": started_at,
+        "intent": results["intent"],
+        "intent_source": intent_source["value"],
+        "workouts": results["tool"],
+        "retrieved_docs": results["retrieval"],
+        "chat_history": results["history"],
+        "summary": session.summary if session is not None else None,
+        "timings": timings,
+    }
+
+
+def _persist_turn(db: Session, req: ChatRequest, turn: Dict, assistant_message: Optional[str]) -> int:
+    """
+    Write the whole turn in one transaction: the session (if new), the user message
+    and, when there is one, the assistant message. Returns the session id.
+    """
+    now = datetime.utcnow()
+    session = turn["session"]
+    try:
+        if session is None:
+            session = ChatSession(user_id=turn["user_id"], title="New Chat", created_at=turn["started_at"], updated_at=now)
             db.add(session)
-            db.commit()
-            db.refresh(session)
-            req.session_id = session.session_id
+            db.flush()  # assigns session_id
+            session_id = session.session_id
+        else:
+            session_id = session.session_id
+            # bump activity for the session list without re-attaching the detached object
+            db.query(ChatSession).filter(ChatSession.session_id == session_id).update(
+                {"updated_at": now}, synchronize_session=False
+            )
+        messages = [ChatMessage(session_id=session_id, role="user", content=req.message,
+                                intent=turn["intent"], intent_source=turn["intent_source"],
+                                timestamp=turn["started_at"])]
+        if assistant_message:
+            messages.append(ChatMessage(session_id=session_id, role="assistant", content=assistant_message, timestamp=now))
+        db.add_all(messages)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return session_id
 
-        # Save user message
-        user_msg = ChatMessage(session_id=req.session_id, role="user", content=req.message)
 
-        db.add(user_msg)
-        db.commit()
-        print("added message to db")
-        # Intent classification
-        intent = classify_intent_rule_based(req.message) or await classify_intent_llm(req.message)
-        print(f"[DEBUG] Classified intent: {intent}")
-
-        workouts = None
-        if intent == "training_suggestion":
-            #user_data = get_user_daily_data(date.today(), db=db, current_user=current_user)
-            inferred_params = await infer_excercise_params(user_message=req.message)
-            print(f"inferred_params:{inferred_params}")
-            workouts = await call_mcp_tool("get_excercises", **inferred_params)
-            print(f"[DEBUG] MCP workouts: {workouts.structured_content}")
-
-        # Document retrieval
-        retrieved_docs = []
-        if req.require_retrieval:
-            retrieved = retrieve_user_docs(req.user_id, intent, top_k=2)
-            retrieved_docs = [
-                {"text": getattr(d, "text", str(d)), "metadata": getattr(d, "metadata", {})}
-                for d in retrieved
-            ]
-
-        # Retrieve last few messages for context
-        history = (
-            db.query(ChatMessage)
-            .filter(ChatMessage.session_id == req.session_id)
-            .order_by(ChatMessage.timestamp.desc())
-            .limit(10)
-            .all()
-        )
-        chat_history = [{"role": m.role, "content": m.content} for m in reversed(history)]
-
-        # Generate LLM response
-        assistant_message = await query_llm(
-            user_message=req.message,
-            chat_history=chat_history,
-            retrieved_docs=[doc["text"] for doc in retrieved_docs],
-            intent=intent,
-            tool_outputs=workouts
-        )
+async def _lookup_cached_answer(req: ChatRequest, turn: Dict):
+    """
+    Check the semantic cache for a generic answer. Returns (answer or None, query vector);
+    personalized turns (retrieved docs, tool output, session history or summary)
+    bypass the cache entirely.
+    """
+    cache = get_response_cache()
+    if not is_cacheable(turn["retrieved_docs"], turn["workouts"], turn["chat_history"], turn["summary"]):
+        cache.record_bypass()
+        return None, None
+    return await run_in_threadpool(cache.lookup, turn["intent"], req.message, turn["user_id"])
+
+
+def _remember_answer(req: ChatRequest, turn: Dict, answer: str, vector):
+    if vector is not None and answer and answer != FALLBACK_RESPONSE:
+        get_response_cache().store(turn["intent"], req.message, turn["user_id"], answer, vector)
+
+
+def _sse(event: str, payload: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(req: ChatRequest, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    turn, persisted = None, False
+    try:
+        turn = await _prepare_turn(req, db, current_user)
+        retrieved_docs = turn["retrieved_docs"]
+
+        assistant_message, query_vector = await _lookup_cached_answer(req, turn)
+        if assistant_message is None:
+            # Generate LLM response
+            assistant_message = await query_llm(
+                user_message=req.message,
+                chat_history=turn["chat_history"],
+                retrieved_docs=[doc["text"] for doc in retrieved_docs],
+                intent=turn["intent"],
+                tool_outputs=turn["workouts"],
+                summary=turn["summary"],
+            )
+            _remember_answer(req, turn, assistant_message, query_vector)
         # print(f"[DEBUG] LLM response: {assistant_message}")
 
-        # Save assistant message
-        ai_msg = ChatMessage(session_id=req.session_id, role="assistant", content=assistant_message)
-        db.add(ai_msg)
-        db.commit()
+        req.session_id = _persist_turn(db, req, turn, assistant_message)
+        persisted = True
+        schedule_summary_refresh(req.session_id)
 
         return ChatResponse(
             session_id=req.session_id,
-            user_id=req.user_id,
+            user_id=turn["user_id"],
             assistant_message=assistant_message,
             retrieved_docs=retrieved_docs,
-            timestamp=datetime.utcnow()
+            timestamp=datetime.utcnow(),
+            timings=turn["timings"],
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
+        # generation failed: still keep the user message, as the stream endpoint does
+        if turn is not None and not persisted:
+            try:
+                with SessionLocal() as write_db:
+                    _persist_turn(write_db, req, turn, None)
+            except Exception as persist_error:
+                print(f"[WARN] failed to persist failed chat turn: {persist_error}")
         raise HTTPException(status_code=500, detail=f"Error in chat endpoint: {str(e)}")
 
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest, request: Request, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    """
+    Streaming variant of /chat over Server-Sent Events.
+    Emits a `meta` event, then one `delta` event per generated chunk, then `done`
+    with the full message and session id (new sessions get their id only then).
+    The turn is persisted once the stream ends; if the client disconnects
+    mid-stream, whatever was generated so far is kept.
+    """
+    try:
+        turn = await _prepare_turn(req, db, current_user)
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error in chat endpoint: {str(e)}")
+
+    retrieved_docs = turn["retrieved_docs"]
+    cached_answer, query_vector = await _lookup_cached_answer(req, turn)
+
+    async def cached_deltas():
+        yield cached_answer
+
+    def persist(message: Optional[str]) -> int:
+        # The request-scoped session may already be closed once streaming starts,
+        # so persist with a short-lived session of our own.
+        with SessionLocal() as write_db:
+            return _persist_turn(write_db, req, turn, message)
+
+    async def event_stream():
+        parts: List[str] = []
+        persisted = False
+        try:
+            yield _sse("meta", {
+                "session_id": req.session_id,
+                "intent": turn["intent"],
+                "retrieved_docs": retrieved_docs,
+                "timings": turn["timings"],
+            })
+            deltas = cached_deltas() if cached_answer is not None else query_llm_stream(
+                user_message=req.message,
+                chat_history=turn["chat_history"],
+                retrieved_docs=[doc["text"] for doc in retrieved_docs],
+                intent=turn["intent"],
+                tool_outputs=turn["workouts"],
+                summary=turn["summary"],
+            )
+            async for delta in deltas:
+                if await request.is_disconnected():
+                    print(f"[DEBUG] client disconnected from session {req.session_id}")
+                    break
+                parts.append(delta)
+                yield _sse("delta", {"text": delta})
+            else:
+                message = "".join(parts).strip() or FALLBACK_RESPONSE
+                if cached_answer is None:
+                    _remember_answer(req, turn, message, query_vector)
+                session_id = await run_in_threadpool(persist, message)
+                persisted = True
+                schedule_summary_refresh(session_id)
+                yield _sse("done", {"session_id": session_id, "assistant_message": message, "timestamp": datetime.utcnow()})
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield _sse("error", {"detail": f"Error in chat endpoint: {str(e)}"})
+        finally:
+            # disconnect or failure: keep the user message and any partial answer
+            if not persisted:
+                try:
+                    persist("".join(parts).strip() or None)
+                except Exception as e:
+                    print(f"[WARN] failed to persist interrupted chat turn: {e}")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+###### History listing (keyset pagination)
+PREVIEW_CHARS = 120
+
+
+def _encode_cursor(ts: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{row_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        ts, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(ts), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/chat/sessions", response_model=SessionPage)
+def list_chat_sessions(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    The user's sessions, most recently active first, each with a preview of its
+    last message. One query per page: the preview comes from a LATERAL subquery
+    backed by the (session_id, timestamp) index.
+    """
+    last_msg = (
+        select(ChatMessage.content, ChatMessage.role, ChatMessage.timestamp)
+        .where(ChatMessage.session_id == ChatSession.session_id)
+        .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+        .limit(1)
+        .lateral("last_msg")
+    )
+    stmt = (
+        select(ChatSession, last_msg.c.content, last_msg.c.role, last_msg.c.timestamp)
+        .outerjoin(last_msg, true())
+        .where(ChatSession.user_id == current_user.user_id)
+        .order_by(ChatSession.updated_at.desc(), ChatSession.session_id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        cursor_ts, cursor_id = _decode_cursor(cursor)
+        stmt = stmt.where(tuple_(ChatSession.updated_at, ChatSession.session_id) < tuple_(cursor_ts, cursor_id))
+
+    rows = db.execute(stmt).all()
+    page = rows[:limit]
+    items = [
+        SessionListItem(
+            session_id=session.session_id,
+            title=session.title,
+            created_at=session.created_at,
+            updated_at=session.updated_at,
+            last_message=(content or "")[:PREVIEW_CHARS] if content is not None else None,
+            last_message_role=role,
+            last_message_at=ts,
+        )
+        for session, content, role, ts in page
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1][0]
+        next_cursor = _encode_cursor(last.updated_at, last.session_id)
+    return SessionPage(items=items, next_cursor=next_cursor)
+
+
+@router.get("/chat/sessions/{session_id}/messages", response_model=MessagePage)
+def list_chat_messages(
+    session_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Messages of one session, newest first. Pass `next_cursor` back as `cursor`
+    to page further into the past.
+    """
+    owned = db.query(ChatSession.session_id).filter(
+        ChatSession.session_id == session_id,
+        ChatSession.user_id == current_user.user_id,
+    ).first()
+    if not owned:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    query = db.query(ChatMessage).filter(ChatMessage.session_id == session_id)
+    if cursor:
+        cursor_ts, cursor_id = _decode_cursor(cursor)
+        query = query.filter(tuple_(ChatMessage.timestamp, ChatMessage.id) < tuple_(cursor_ts, cursor_id))
+    rows = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(limit + 1).all()
+
+    page = rows[:limit]
+    next_cursor = _encode_cursor(page[-1].timestamp, page[-1].id) if len(rows) > limit else None
+    return MessagePage(
+        items=[MessageItem(id=m.id, role=m.role, content=m.content or "", timestamp=m.timestamp) for m in page],
+        next_cursor=next_cursor,
+    )
@@ -1,12 +1,15 @@
 import httpx
 import os
 import time
-from datetime import datetime, timedelta
+import asyncio
+from datetime import datetime, timedelta, date
+from typing import Dict, List
 from authlib.integrations.starlette_client import OAuth
 from starlette.config import Config
 from dotenv import load_dotenv
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, HTTPException, Query
 from fastapi.responses import RedirectResponse, JSONResponse
+from server.services.http_client import get_upstream, CircuitOpenError
 
 
 load_dotenv()
@@ -41,6 +44,35 @@ SCOPES = [
     "https://www.googleapis.com/auth/fitness.body.read"
 ]
 
+# Google Fit rejects aggregate requests spanning too many buckets, so long
+# windows are split into chunks of at most this many days.
+FIT_CHUNK_DAYS = int(os.getenv("FIT_CHUNK_DAYS", 30))
+FIT_MAX_CONCURRENCY = int(os.getenv("FIT_MAX_CONCURRENCY", 4))
+FIT_MAX_RANGE_DAYS = 366
+DAY_MILLIS = 86400000
+
+FIT_AGGREGATE_PATH = "/users/me/dataset:aggregate"
+
+FIT_AGGREGATE_BY = [
+    {
+        "dataTypeName": "com.google.step_count.delta",
+        "dataSourceId": "derived:com.google.step_count.delta:com.google.android.gms:estimated_steps"
+    },
+    {"dataTypeName": "com.google.calories.expended"},
+    {"dataTypeName": "com.google.distance.delta"},
+    {"dataTypeName": "com.google.active_minutes"},
+    {"dataTypeName": "com.google.floor_climb.delta"}
+]
+
+# dataTypeName -> (series key, value field)
+FIT_SERIES = {
+    "com.google.step_count.delta": ("steps", "intVal"),
+    "com.google.calories.expended": ("calories", "fpVal"),
+    "com.google.distance.delta": ("distance", "fpVal"),
+    "com.google.active_minutes": ("activeMinutes", "intVal"),
+    "com.google.floor_climb.delta": ("floors", "fpVal"),
+}
+
 router = APIRouter()
 
 # ----- Helpers -----
@@ -57,19 +89,18 @@ def get_google_auth_url():
     )
 
 async def get_tokens(code: str):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://oauth2.googleapis.com/token",
-            data={
-                "code": code,
-                "client_id": GOOGLE_CLIENT_ID,
-                "client_secret": GOOGLE_CLIENT_SECRET,
-                "redirect_uri": REDIRECT_URI,
-                "grant_type": "authorization_code",
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        return response.json()
+    response = await get_upstream("google_oauth").post(
+        "/token",
+        data={
+            "code": code,
+            "client_id": GOOGLE_CLIENT_ID,
+            "client_secret": GOOGLE_CLIENT_SECRET,
+            "redirect_uri": REDIRECT_URI,
+            "grant_type": "authorization_code",
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    return response.json()
 
 async def fetch_fitness_summary(access_token: str):
     end_time = int(time.time() * 1000)
@@ -84,29 +115,96 @@ async def fetch_fitness_summary(access_token: str):
     }
 
     body = {
-        "aggregateBy": [
-            {
-                "dataTypeName": "com.google.step_count.delta",
-                "dataSourceId": "derived:com.google.step_count.delta:com.google.android.gms:estimated_steps"
-            },
-            {"dataTypeName": "com.google.calories.expended"},
-            {"dataTypeName": "com.google.distance.delta"},
-            {"dataTypeName": "com.google.active_minutes"},
-            {"dataTypeName": "com.google.floor_climb.delta"}
-        ],
-
-        "bucketByTime": {"durationMillis": 86400000},
+        "aggregateBy": FIT_AGGREGATE_BY,
+        "bucketByTime": {"durationMillis": DAY_MILLIS},
         "startTimeMillis": start_time,
         "endTimeMillis": end_time
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://www.googleapis.com/fitness/v1/users/me/dataset:aggregate",
-            headers=headers,
-            json=body
-        )
-        return response.json()
+    response = await get_upstream("google_fit").post(FIT_AGGREGATE_PATH, headers=headers, json=body)
+    return response.json()
+
+def _day_start_millis(day: date) -> int:
+    return int(datetime.combine(day, datetime.min.time()).timestamp() * 1000)
+
+
+def _split_range(start_date: date, end_date: date, chunk_days: int = FIT_CHUNK_DAYS):
+    """Yield (chunk_start, chunk_end) date pairs covering [start_date, end_date]."""
+    cursor = start_date
+    while cursor <= end_date:
+        chunk_end = min(cursor + timedelta(days=chunk_days - 1), end_date)
+        yield cursor, chunk_end
+        cursor = chunk_end + timedelta(days=1)
+
+
+async def _fetch_aggregate_chunk(semaphore: asyncio.Semaphore, headers: Dict[str, str],
+                                 start_date: date, end_date: date):
+    body = {
+        "aggregateBy": FIT_AGGREGATE_BY,
+        "bucketByTime": {"durationMillis": DAY_MILLIS},
+        "startTimeMillis": _day_start_millis(start_date),
+        "endTimeMillis": _day_start_millis(end_date + timedelta(days=1)),
+    }
+    async with semaphore:
+        response = await get_upstream("google_fit").post(FIT_AGGREGATE_PATH, headers=headers, json=body)
+    response.raise_for_status()
+    return response.json()
+
+
+def parse_buckets_into(series: Dict[str, List], buckets: List[dict], start_date: date):
+    """
+    Accumulate aggregate buckets into the per-day arrays of `series`.
+    Each bucket is placed by its start time relative to `start_date`.
+    """
+    origin = _day_start_millis(start_date)
+    days = len(series["dates"])
+    for bucket in buckets:
+        idx = (int(bucket.get("startTimeMillis", origin)) - origin) // DAY_MILLIS
+        if idx < 0 or idx >= days:
+            continue
+        for dataset in bucket.get("dataset", []):
+            for point in dataset.get("point", []):
+                key_field = FIT_SERIES.get(point.get("dataTypeName"))
+                values = point.get("value")
+                if not key_field or not values:
+                    continue
+                key, field = key_field
+                series[key][idx] += values[0].get(field, 0) or 0
+
+
+async def fetch_fitness_range(access_token: str, start_date: date, end_date: date) -> Dict[str, List]:
+    """
+    Fetch daily aggregates for an arbitrary date range. The window is split into
+    API-sized chunks which are requested concurrently (bounded by
+    FIT_MAX_CONCURRENCY) and parsed into compact per-day arrays.
+    """
+    days = (end_date - start_date).days + 1
+    series: Dict[str, List] = {
+        "dates": [(start_date + timedelta(days=i)).isoformat() for i in range(days)],
+        "steps": [0] * days,
+        "calories": [0.0] * days,
+        "distance": [0.0] * days,
+        "activeMinutes": [0] * days,
+        "floors": [0.0] * days,
+    }
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+    semaphore = asyncio.Semaphore(FIT_MAX_CONCURRENCY)
+
+    chunks = await asyncio.gather(*[
+        _fetch_aggregate_chunk(semaphore, headers, chunk_start, chunk_end)
+        for chunk_start, chunk_end in _split_range(start_date, end_date)
+    ])
+
+    for chunk in chunks:
+        parse_buckets_into(series, chunk.get("bucket", []), start_date)
+
+    series["calories"] = [int(v) for v in series["calories"]]
+    series["distance"] = [round(v / 1000, 2) for v in series["distance"]]
+    series["floors"] = [int(v) for v in series["floors"]]
+    return series
 
 # ----- Routes -----
 
@@ -163,3 +261,25 @@ async def get_fitness_summary(access_token: str):
                     summary["floors"] += val.get("intVal", 0)
 
     return JSONResponse(content=summary)
+
+
+@router.get("/fit/range")
+async def get_fitness_range(
+    access_token: str,
+    start: date = Query(..., description="First day (YYYY-MM-DD), inclusive"),
+    end: date = Query(None, description="Last day (YYYY-MM-DD), inclusive; defaults to today"),
+):
+    end = end or date.today()
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+    if (end - start).days + 1 > FIT_MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {FIT_MAX_RANGE_DAYS} days")
+
+    try:
+        series = await fetch_fitness_range(access_token, start, end)
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=e.response.text)
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return JSONResponse(content=series)
@@ -1,14 +1,16 @@
-from fastapi import APIRouter,Query, Depends
+from fastapi import APIRouter,Query, Depends, HTTPException
 import httpx
 import os
 from dotenv  import load_dotenv
 from server.models import FoodEntry,DailyNutritionLog
+from server.services.reindex_queue import enqueue_reindex
 from server.database import get_db 
 from pydantic import BaseModel
 from enum import Enum
 from sqlalchemy.orm import Session
 from typing import Optional
 from server.auth import get_current_user
+from server.services.http_client import get_upstream, CircuitOpenError
 from datetime import date,datetime,timedelta
 from typing import List
 import pytz
@@ -64,12 +66,15 @@ class DailyMealsResponse(BaseModel):
 
 @router.get("/api/v1/foods")
 async def search_foods(query:str=Query(...,description="Food name to search")):
-    url = f"https://api.nal.usda.gov/fdc/v1/foods/search"
     params = {"query": query, "pageSize": 10, "api_key": USDA_API_KEY}
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, params=params)
+    try:
+        r = await get_upstream("usda").get("/fdc/v1/foods/search", params=params)
         r.raise_for_status()
-        return r.json()
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"USDA lookup failed: {e}")
+    return r.json()
     
 
 @router.post("/api/v1/food-entry")
@@ -117,6 +122,7 @@ def create_food_entry(entry: FoodEntryCreate, db: Session = Depends(get_db),curr
 
     db.commit()
     db.refresh(db_entry)
+    enqueue_reindex(user_id, today)
     return {"message": "Food entry saved", "id": db_entry.id}
 
 @router.get("/api/v1/food/today")
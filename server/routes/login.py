@@ -10,6 +10,7 @@ import jose.jwt as jwt
 from passlib.context import CryptContext
 import os
 from server.pydatnes import schemas
+from server.services.reindex_queue import enqueue_reindex
 
 
 router=APIRouter()
@@ -183,6 +184,10 @@ def save_onboarding_data(db: Session, user_id: int, data: schemas.OnboardingData
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to save data to database: {e}")
 
+    # profile, goal and stats all feed the daily document
+    if stats_data.date:
+        enqueue_reindex(user_id, stats_data.date)
+
     return {
         "profile": profile_data,
         "goal": goal_data,
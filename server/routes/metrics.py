@@ -0,0 +1,59 @@
+from fastapi import APIRouter
+from server.services.http_client import upstream_metrics
+from server.services.llm_helper import llm_gateway
+from server.services.stage_graph import stage_metrics
+from server.services.response_cache import get_response_cache
+from server.services import exercise_params
+from server.mcp_agents.mcp_client import mcp_pool
+from server.services.reindex_queue import reindex_queue
+from server.mcp_agents.agent_helpers import embedding_cache_stats, kb_timings
+
+router = APIRouter(prefix="/api/metrics", tags=["Metrics"])
+
+
+@router.get("/upstreams")
+def get_upstream_metrics():
+    """Per-upstream request counts, error counts, latency and circuit state."""
+    return upstream_metrics()
+
+
+@router.get("/llm")
+def get_llm_metrics():
+    """LLM gateway concurrency, queue depth per priority, wait times and timeouts."""
+    return llm_gateway.snapshot()
+
+
+@router.get("/stages")
+def get_stage_metrics():
+    """Average and max duration of each pipeline stage (e.g. the chat turn graph)."""
+    return stage_metrics.snapshot()
+
+
+@router.get("/response_cache")
+def get_response_cache_metrics():
+    """Semantic chat cache hit rate, bypasses, evictions and entries per intent."""
+    return get_response_cache().snapshot()
+
+
+@router.get("/exercise_params")
+def get_exercise_param_metrics():
+    """How training questions were resolved: local extractor, cached LLM answer, LLM, or defaults."""
+    return exercise_params.stats
+
+
+@router.get("/mcp")
+def get_mcp_metrics():
+    """MCP session pool state, cached tool registry and per-tool call latency."""
+    return mcp_pool.snapshot()
+
+
+@router.get("/reindex")
+def get_reindex_metrics():
+    """Knowledge-base re-index queue: pending/coalesced jobs, documents re-embedded vs unchanged, failures."""
+    return reindex_queue.snapshot()
+
+
+@router.get("/embeddings")
+def get_embedding_metrics():
+    """Embedding cache hit rate (memory and disk) and knowledge-base component load times."""
+    return {"cache": embedding_cache_stats(), "load_ms": kb_timings}
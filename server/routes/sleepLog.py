@@ -7,6 +7,7 @@ from typing import Optional
 from server.database import get_db
 from server.models import SleepLog,WeeklySleepSummary,User
 from server.auth import get_current_user
+from server.services.reindex_queue import enqueue_reindex
 
 router=APIRouter()
 
@@ -66,6 +67,7 @@ def log_sleep(
     setattr(weekly_summary, weekday_map[sleep_data.date.weekday()], sleep_data.sleep_duration_hours)
 
     db.commit()
+    enqueue_reindex(user_id, new_log.date)
 
     return {"message":"Sleep log added successfully","log_id":new_log.id}
 
@@ -213,4 +215,5 @@ def update_sleep_log(
     db.commit()
     db.refresh(log)
     update_weekly_summary(db, user_id, target_date, sleep_data.sleep_duration_hours)
+    enqueue_reindex(user_id, target_date)
     return {"message": "Sleep log updated", "log_id": log.id}
\ No newline at end of file
@@ -7,6 +7,7 @@ from typing import List
 from .. import models
 from ..database import get_db
 from ..auth import get_current_user
+from ..services.reindex_queue import enqueue_reindex
 import pytz
 from pytz import timezone
 
@@ -50,6 +51,7 @@ def log_water(
     db.add(new_log)
     db.commit()
     db.refresh(new_log)
+    enqueue_reindex(current_user.user_id, new_log.timestamp.date())
     return new_log
 
 @router.get("/api/v1/water/today", response_model=TodaysWaterResponse)
@@ -109,5 +111,6 @@ def update_latest_water_log(
     log.amount_ml = data.amount_ml
     db.commit()
     db.refresh(log)
+    enqueue_reindex(current_user.user_id, log.timestamp.date())
 
     return {"message": "Log updated", "log": log}
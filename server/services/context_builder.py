@@ -0,0 +1,237 @@
+'''
+Token-budgeted prompt assembly for chat turns.
+
+The prompt is built from the system prompt, the session's rolling summary,
+tool output items, retrieved documents and recent turns, each capped by a
+share of CHAT_CONTEXT_TOKENS. Documents and tool items are ranked by term
+overlap with the user's message so the most relevant ones survive the cut;
+recent turns fill whatever budget is left, newest first.
+
+Older turns are folded into ChatSession.summary by `refresh_session_summary`,
+which runs in the background after a turn is answered. Chat history is every
+message after the summary's high-water mark, so turns waiting to be folded
+still reach the prompt.
+'''
+import asyncio
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", 3000))
+SUMMARY_SHARE = 0.15
+TOOL_SHARE = 0.35
+DOCS_SHARE = 0.30
+
+# newest turns never folded; anything older is eligible for the rolling summary
+RECENT_WINDOW = int(os.getenv("CHAT_RECENT_WINDOW", 10))
+# fold into the summary only once this many turns have aged out of the window
+SUMMARY_BATCH = int(os.getenv("CHAT_SUMMARY_BATCH", 6))
+SUMMARY_MAX_TOKENS = 250
+# section headers and the tool instructions
+PROMPT_OVERHEAD_TOKENS = 60
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting English prompts
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    max_chars = max(tokens, 0) * 4
+    return text if len(text) <= max_chars else text[:max_chars].rsplit(" ", 1)[0] + " …"
+
+
+def rank_by_relevance(query: str, texts: List[str]) -> List[str]:
+    """Order texts by how many of the query's words they contain (stable for ties)."""
+    query_terms = set(_WORD_RE.findall(query.lower()))
+    scored = [
+        (len(query_terms & set(_WORD_RE.findall(text.lower()))), -i, text)
+        for i, text in enumerate(texts)
+    ]
+    return [text for _, _, text in sorted(scored, reverse=True)]
+
+
+def extract_tool_items(tool_outputs: Any) -> Tuple[str, List[str]]:
+    """Flatten an MCP tool result into (tool name, one formatted string per item)."""
+    if hasattr(tool_outputs, "structured_content") and tool_outputs.structured_content \
+            and "result" in tool_outputs.structured_content:
+        output = tool_outputs.structured_content["result"]
+    elif hasattr(tool_outputs, "content"):
+        output = tool_outputs.content
+    elif isinstance(tool_outputs, (dict, list)):
+        output = tool_outputs
+    else:
+        output = []
+    tool_name = getattr(tool_outputs, "tool_id", "tool_output")
+
+    if isinstance(output, list):
+        items = []
+        for item in output:
+            if isinstance(item, dict):
+                # List of dicts (like exercises)
+                items.append(
+                    f"- {item.get('name', 'Unnamed')} ({item.get('type', 'N/A')} - {item.get('difficulty', 'N/A')})\n"
+                    f"  Muscle: {item.get('muscle', 'N/A')}\n"
+                    f"  Instructions: {item.get('instructions', 'No instructions')}"
+                )
+            else:
+                items.append(str(getattr(item, "text", item)))
+        return tool_name, items
+    if isinstance(output, dict):
+        return tool_name, [f"{k}: {v}" for k, v in output.items()]
+    return tool_name, [str(output)]
+
+
+def _take(texts: List[str], budget: int) -> Tuple[List[str], int]:
+    """Greedily keep texts in order while they fit; the first one is truncated rather than dropped."""
+    kept, used = [], 0
+    for text in texts:
+        cost = estimate_tokens(text)
+        if used + cost > budget:
+            if not kept and budget - used > 20:
+                text = truncate_to_tokens(text, budget - used)
+                kept.append(text)
+                used += estimate_tokens(text)
+            break
+        kept.append(text)
+        used += cost
+    return kept, used
+
+
+def build_prompt(
+        system_prompt: str,
+        user_message: str,
+        chat_history: List[dict],
+        tool_outputs: Any = None,
+        retrieved_docs: Optional[List[str]] = None,
+        intent: Optional[str] = "general",
+        summary: Optional[str] = None,
+        budget: int = CHAT_CONTEXT_TOKENS,
+) -> str:
+    remaining = budget - PROMPT_OVERHEAD_TOKENS - estimate_tokens(system_prompt) - estimate_tokens(user_message)
+
+    summary_text = ""
+    if summary:
+        summary_text = truncate_to_tokens(summary, int(budget * SUMMARY_SHARE))
+        remaining -= estimate_tokens(summary_text)
+
+    tool_block = ""
+    if tool_outputs:
+        tool_name, items = extract_tool_items(tool_outputs)
+        kept, used = _take(rank_by_relevance(user_message, items), min(int(budget * TOOL_SHARE), remaining))
+        if kept:
+            remaining -= used
+            tool_block = (
+                f"[{tool_name}]\n" + "\n".join(kept) + "\n\n"
+                # Prompt LLM to integrate tool outputs
+                "Using the above data, write a clear, concise, and friendly response to the user.\n\n"
+                "including advice or formatting as appropriate.\n\n"
+            )
+
+    docs_block = ""
+    if retrieved_docs:
+        kept, used = _take(rank_by_relevance(user_message, retrieved_docs), min(int(budget * DOCS_SHARE), remaining))
+        if kept:
+            remaining -= used
+            docs_block = f"[Context from {intent} documents]\n" + "\n\n".join(kept) + "\n\n"
+
+    # newest turns first until the budget runs out, then restore chronological order
+    turns = [f"{m['role'].capitalize()}: {m['content']}" for m in reversed(chat_history)]
+    kept_turns, _ = _take(turns, max(remaining, 0))
+
+    conversation_text = system_prompt + "\n\n"
+    if summary_text:
+        conversation_text += f"[Earlier in this conversation]\n{summary_text}\n\n"
+    for turn in reversed(kept_turns):
+        conversation_text += turn + "\n"
+    conversation_text += f"User: {user_message}\n\n"
+    conversation_text += docs_block
+    conversation_text += tool_block
+    return conversation_text
+
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a user and a fitness assistant.
+Update the summary with the new messages. Keep facts the user shared (goals, injuries,
+preferences, numbers) and advice already given. Write at most {max_words} words, plain text.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:
+"""
+
+
+async def refresh_session_summary(session_id: int):
+    """
+    Fold turns that have aged out of the recent window into ChatSession.summary.
+    Runs at background LLM priority with its own DB session; does nothing until
+    SUMMARY_BATCH turns are pending.
+    """
+    from server.database import SessionLocal
+    from server.models import ChatMessage, ChatSession
+    from server.services.llm_helper import generate_text
+    from server.services.llm_gateway import Priority
+
+    with SessionLocal() as db:
+        session = db.query(ChatSession).filter(ChatSession.session_id == session_id).first()
+        if not session:
+            return
+        pending = (
+            db.query(ChatMessage)
+            .filter(ChatMessage.session_id == session_id, ChatMessage.id > (session.summary_message_id or 0))
+            .order_by(ChatMessage.id)
+            .all()
+        )
+        to_fold = pending[:-RECENT_WINDOW] if len(pending) > RECENT_WINDOW else []
+        if len(to_fold) < SUMMARY_BATCH:
+            return
+        current_summary = session.summary or "(empty)"
+        last_folded_id = to_fold[-1].id
+        messages = "\n".join(f"{m.role.capitalize()}: {m.content}" for m in to_fold)
+        db.rollback()  # release the connection while the LLM runs
+
+    prompt = SUMMARY_PROMPT.format(
+        max_words=int(SUMMARY_MAX_TOKENS * 0.75), summary=current_summary, messages=messages
+    )
+    new_summary = await generate_text(prompt, priority=Priority.BACKGROUND)
+    if not new_summary:
+        return
+
+    with SessionLocal() as db:
+        # only advance if nobody else folded these turns meanwhile
+        updated = (
+            db.query(ChatSession)
+            .filter(
+                ChatSession.session_id == session_id,
+                (ChatSession.summary_message_id == None) | (ChatSession.summary_message_id < last_folded_id),  # noqa: E711
+            )
+            .update(
+                {"summary": truncate_to_tokens(new_summary, SUMMARY_MAX_TOKENS), "summary_message_id": last_folded_id},
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if updated:
+            print(f"[DEBUG] refreshed summary for session {session_id} up to message {last_folded_id}")
+
+
+_background_tasks = set()
+
+
+def schedule_summary_refresh(session_id: int):
+    """Fire-and-forget refresh_session_summary; keeps a reference so the task is not GC'd."""
+    async def run():
+        try:
+            await refresh_session_summary(session_id)
+        except Exception as e:
+            print(f"[WARN] summary refresh failed for session {session_id}: {e}")
+
+    task = asyncio.create_task(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
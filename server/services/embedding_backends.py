@@ -0,0 +1,243 @@
+'''
+Pluggable embedding backends plus a content-hash embedding cache.
+
+EMBED_BACKEND selects how the MiniLM model runs in-process:
+    torch  - LlamaIndex HuggingFaceEmbedding (default, previous behaviour)
+    onnx   - sentence-transformers on ONNX Runtime with the int8-quantized
+             export shipped in the model repo (EMBED_ONNX_FILE); several
+             times faster on CPU. Falls back to torch if optimum/onnxruntime
+             are not installed.
+    openvino - sentence-transformers on OpenVINO (Intel CPUs).
+
+Every model handed out by agent_helpers is wrapped in CachedEmbedding:
+vectors are cached by sha256(model, kind, text) in an LRU of EMBED_CACHE_SIZE
+entries, optionally backed by a sqlite file (EMBED_CACHE_PATH) so repeated
+queries and unchanged documents skip inference across restarts too.
+
+Vectors differ slightly between backends. The backend that actually loaded
+(model_backend: after a fallback, or as reported by the sidecar) is part of
+the cache key and of agent_helpers.embed_model_id(), which is recorded with
+every indexed document so the backfill re-embeds those from another backend.
+'''
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+EMBED_ONNX_FILE = os.getenv("EMBED_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", 20000))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH")  # e.g. storage/embeddings.sqlite; unset = memory only
+
+
+def model_backend(model) -> str:
+    """Backend the model really runs on; models without a `backend` are LlamaIndex torch models."""
+    return getattr(model, "backend", None) or "torch"
+
+
+class EmbeddingCache:
+    def __init__(self, size: int = EMBED_CACHE_SIZE, path: Optional[str] = EMBED_CACHE_PATH):
+        self.size = size
+        self.path = path
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._db() as db:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def _db(self) -> sqlite3.Connection:
+        # sqlite connections are per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10)
+        return conn
+
+    @staticmethod
+    def key(model: str, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{kind}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    found[key] = vector.tolist()
+            self.hits += len(found)
+        missing = [k for k in keys if k not in found]
+        if missing and self.path:
+            placeholders = ",".join("?" * len(missing))
+            rows = self._db().execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", missing
+            ).fetchall()
+            with self._lock:
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vector)
+                    found[key] = vector.tolist()
+                self.disk_hits += len(rows)
+        with self._lock:
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        vectors = {k: np.asarray(v, dtype=np.float32) for k, v in items.items()}
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+        if self.path and vectors:
+            db = self._db()
+            db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(k, v.tobytes()) for k, v in vectors.items()],
+            )
+            db.commit()
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "size": self.size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None,
+            "disk_path": self.path,
+        }
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Wraps any LlamaIndex embedding model; only cache misses reach the inner model, in one batch."""
+
+    _inner: Any = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, cache: Optional[EmbeddingCache] = None, **kwargs):
+        kwargs.setdefault("model_name", getattr(inner, "model_name", "unknown"))
+        kwargs.setdefault("embed_batch_size", max(getattr(inner, "embed_batch_size", 10), 64))
+        super().__init__(**kwargs)
+        self._inner = inner
+        self._cache = cache or EmbeddingCache()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    @property
+    def backend(self) -> str:
+        return model_backend(self._inner)
+
+    def _cached(self, texts: List[str], kind: str) -> List[List[float]]:
+        # backends produce slightly different vectors, so they never share entries
+        backend = self.backend
+        prefix = f"{self.model_name}:{self._inner.class_name()}:{backend}"
+        keys = [EmbeddingCache.key(prefix, kind, t) for t in texts]
+        found = self._cache.get_many(list(dict.fromkeys(keys)))
+        todo = {k: t for k, t in zip(keys, texts) if k not in found}
+        if todo:
+            if kind == "query":
+                computed = [self._inner.get_query_embedding(t) for t in todo.values()]
+            else:
+                computed = self._inner.get_text_embedding_batch(list(todo.values()))
+            fresh = dict(zip(todo.keys(), computed))
+            if self.backend == backend:  # unless the inner model switched backends mid-call (sidecar fallback)
+                self._cache.put_many(fresh)
+            found.update(fresh)
+        return [found[k] for k in keys]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._cached([query], "query")[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._cached([text], "text")[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._cached(texts, "text")
+
+
+class SentenceTransformerEmbedding(BaseEmbedding):
+    """sentence-transformers model on a non-torch backend (ONNX Runtime / OpenVINO)."""
+
+    backend: str = "onnx"
+
+    _model: Any = PrivateAttr()
+
+    def __init__(self, model_name: str, backend: str = "onnx", file_name: Optional[str] = None, **kwargs):
+        from sentence_transformers import SentenceTransformer
+
+        super().__init__(model_name=model_name, backend=backend, **kwargs)
+        model_kwargs = {"file_name": file_name} if file_name else {}
+        self._model = SentenceTransformer(model_name, backend=backend, model_kwargs=model_kwargs, device="cpu")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "SentenceTransformerEmbedding"
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        # normalized like HuggingFaceEmbedding, so vectors stay comparable with the existing index
+        return self._model.encode(texts, batch_size=self.embed_batch_size, normalize_embeddings=True).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._encode([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts)
+
+
+def build_embed_model(model_name: str, backend: str = EMBED_BACKEND) -> BaseEmbedding:
+    """The in-process model for `backend`; torch if the requested runtime is unavailable."""
+    started = time.perf_counter()
+    model = None
+    if backend in ("onnx", "openvino"):
+        try:
+            model = SentenceTransformerEmbedding(
+                model_name, backend=backend, file_name=EMBED_ONNX_FILE if backend == "onnx" else None,
+                embed_batch_size=64,
+            )
+        except Exception as e:
+            print(f"[WARN] {backend} embedding backend unavailable ({e}); using torch")
+    if model is None:
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+        backend = "torch"
+        model = HuggingFaceEmbedding(model_name=model_name)
+    print(f"[DEBUG] embedding backend {backend} loaded in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return model
+
+
+def with_cache(model: BaseEmbedding) -> BaseEmbedding:
+    return CachedEmbedding(model) if EMBED_CACHE_SIZE > 0 else model
@@ -0,0 +1,91 @@
+'''
+LlamaIndex embedding model backed by the embedding sidecar (see
+embedding_service). Used by agent_helpers.get_embed_model when
+EMBEDDING_SOCKET is set; falls back to an in-process model if the sidecar
+is unreachable, so a missing sidecar degrades memory use, not availability.
+If the in-process model runs a different backend than the sidecar (or the
+sidecar's is unknown), the fallback becomes permanent for this process, so
+`backend` always names the backend that produced the vectors.
+'''
+import asyncio
+from typing import Any, List, Optional
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+from server.services.embedding_service import EmbeddingSidecarClient
+
+
+class SidecarEmbedding(BaseEmbedding):
+    socket_path: str
+
+    _client: Any = PrivateAttr()
+    _fallback: Any = PrivateAttr(default=None)
+    _backend: Any = PrivateAttr(default=None)
+    _fallback_only: bool = PrivateAttr(default=False)
+
+    def __init__(self, socket_path: str, **kwargs):
+        super().__init__(socket_path=socket_path, **kwargs)
+        self._client = EmbeddingSidecarClient(socket_path)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "SidecarEmbedding"
+
+    def _sidecar_backend(self) -> Optional[str]:
+        if self._backend is None:
+            try:
+                self._backend = self._client.stats().get("backend") or "torch"
+            except (OSError, RuntimeError):
+                return None
+        return self._backend
+
+    @property
+    def backend(self) -> str:
+        """Backend that produces the vectors: the sidecar's, or the in-process model's once it took over."""
+        from server.services.embedding_backends import model_backend
+
+        if self._fallback_only:
+            return model_backend(self._fallback)
+        return self._sidecar_backend() or model_backend(self._local())
+
+    def _local(self):
+        if self._fallback is None:
+            from server.mcp_agents.agent_helpers import load_local_embed_model
+
+            print(f"[WARN] embedding sidecar at {self.socket_path} unreachable; loading the model in-process")
+            self._fallback = load_local_embed_model()
+        return self._fallback
+
+    def _embed_local(self, texts: List[str], kind: str) -> List[List[float]]:
+        model = self._local()
+        if kind == "query":
+            return [model.get_query_embedding(t) for t in texts]
+        return model.get_text_embedding_batch(texts)
+
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        if self._fallback_only:
+            return self._embed_local(texts, kind)
+        try:
+            return self._client.embed(texts, kind=kind)
+        except (OSError, RuntimeError) as e:
+            from server.services.embedding_backends import model_backend
+
+            print(f"[WARN] embedding sidecar call failed: {e}")
+            if self._sidecar_backend() != model_backend(self._local()):
+                # its vectors must not be mixed with the sidecar's under one backend tag
+                print("[WARN] in-process model runs another backend; not switching back to the sidecar")
+                self._fallback_only = True
+            return self._embed_local(texts, kind)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query], "query")[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text], "text")[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "text")
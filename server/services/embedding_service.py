@@ -0,0 +1,239 @@
+'''
+Embedding sidecar: one process per host holds the embedding model and serves
+every API/worker process over a Unix socket, so the model is loaded once
+instead of once per worker.
+
+Concurrent requests are micro-batched: the first request opens a window of
+EMBED_MAX_WAIT_MS (or until EMBED_MAX_BATCH texts are queued), and the whole
+window runs through the model in a single forward pass.
+
+Wire format, both directions: 4-byte big-endian length + JSON.
+    request   {"kind": "query" | "text" | "stats", "texts": [...]}
+    response  {"dim": 384, "vectors": "<base64 float32, row-major>"} | {"error": "..."}
+
+    python -m server.services.embedding_service --socket /tmp/fitness-embed.sock
+and set EMBEDDING_SOCKET=/tmp/fitness-embed.sock for the API workers.
+'''
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+EMBEDDING_SOCKET = os.getenv("EMBEDDING_SOCKET")
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", 64))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", 5))
+CLIENT_TIMEOUT = float(os.getenv("EMBED_CLIENT_TIMEOUT", 30))
+
+_HEADER = struct.Struct(">I")
+
+
+def encode_vectors(vectors: List[List[float]]) -> Dict[str, Any]:
+    arr = np.asarray(vectors, dtype=np.float32)
+    return {"dim": int(arr.shape[1]) if arr.ndim == 2 else 0, "vectors": base64.b64encode(arr.tobytes()).decode()}
+
+
+def decode_vectors(payload: Dict[str, Any]) -> List[List[float]]:
+    arr = np.frombuffer(base64.b64decode(payload["vectors"]), dtype=np.float32)
+    return arr.reshape(-1, payload["dim"]).tolist() if payload["dim"] else []
+
+
+# ---------------------------------------------------------------- server
+
+
+class _Request:
+    __slots__ = ("kind", "texts", "future")
+
+    def __init__(self, kind: str, texts: List[str], future: asyncio.Future):
+        self.kind = kind
+        self.texts = texts
+        self.future = future
+
+
+class EmbeddingServer:
+    def __init__(self, model, max_batch: int = EMBED_MAX_BATCH, max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue: Optional[asyncio.Queue] = None
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "batch_texts": 0, "model_ms": 0.0, "errors": 0}
+
+    def _embed(self, kind: str, texts: List[str]) -> List[List[float]]:
+        # queries only differ from documents when the model adds a query instruction
+        if kind == "query" and getattr(self.model, "query_instruction", None):
+            return [self.model.get_query_embedding(t) for t in texts]
+        return self.model.get_text_embedding_batch(texts)
+
+    async def _collect(self) -> List[_Request]:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        size = len(batch[0].texts)
+        deadline = loop.time() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += len(item.texts)
+        return batch
+
+    async def _batcher(self):
+        while True:
+            batch = await self._collect()
+            for kind in {r.kind for r in batch}:
+                requests = [r for r in batch if r.kind == kind]
+                texts = [t for r in requests for t in r.texts]
+                started = time.perf_counter()
+                try:
+                    vectors = await asyncio.to_thread(self._embed, kind, texts)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    for r in requests:
+                        if not r.future.done():
+                            r.future.set_exception(e)
+                    continue
+                self.stats["model_ms"] += (time.perf_counter() - started) * 1000
+                self.stats["batches"] += 1
+                self.stats["batch_texts"] += len(texts)
+                offset = 0
+                for r in requests:
+                    if not r.future.done():
+                        r.future.set_result(vectors[offset:offset + len(r.texts)])
+                    offset += len(r.texts)
+
+    def snapshot(self) -> Dict[str, Any]:
+        from server.services.embedding_backends import model_backend
+
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "backend": model_backend(self.model),
+            "avg_batch": round(self.stats["batch_texts"] / batches, 2) if batches else None,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    return
+                request = json.loads(await reader.readexactly(_HEADER.unpack(header)[0]))
+                if request.get("kind") == "stats":
+                    response = self.snapshot()
+                else:
+                    texts = [str(t) for t in request.get("texts") or []]
+                    self.stats["requests"] += 1
+                    self.stats["texts"] += len(texts)
+                    future = asyncio.get_running_loop().create_future()
+                    await self.queue.put(_Request(request.get("kind", "text"), texts, future))
+                    try:
+                        response = encode_vectors(await future) if texts else {"dim": 0, "vectors": ""}
+                    except Exception as e:
+                        response = {"error": str(e)}
+                body = json.dumps(response).encode()
+                writer.write(_HEADER.pack(len(body)) + body)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, path: str):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.queue = asyncio.Queue()
+        batcher = asyncio.create_task(self._batcher())
+        server = await asyncio.start_unix_server(self._handle, path=path)
+        os.chmod(path, 0o660)
+        print(f"[embedding] serving on {path} (max_batch={self.max_batch}, max_wait={self.max_wait * 1000:.0f}ms)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+# ---------------------------------------------------------------- client
+
+
+class EmbeddingSidecarClient:
+    """Blocking client; one connection per thread, reconnecting once on a broken socket."""
+
+    def __init__(self, path: str, timeout: float = CLIENT_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def _recv_exactly(self, sock: socket.socket, size: int) -> bytes:
+        chunks, remaining = [], size
+        while remaining:
+            chunk = sock.recv(remaining)
+            if not chunk:
+                raise ConnectionError("embedding sidecar closed the connection")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def _roundtrip(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        body = json.dumps(request).encode()
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None) or self._connect()
+            try:
+                sock.sendall(_HEADER.pack(len(body)) + body)
+                size = _HEADER.unpack(self._recv_exactly(sock, _HEADER.size))[0]
+                response = json.loads(self._recv_exactly(sock, size))
+                break
+            except (ConnectionError, socket.timeout, OSError):
+                self._close()
+                if attempt:
+                    raise
+        if "error" in response:
+            raise RuntimeError(f"embedding sidecar: {response['error']}")
+        return response
+
+    def embed(self, texts: List[str], kind: str = "text") -> List[List[float]]:
+        if not texts:
+            return []
+        return decode_vectors(self._roundtrip({"kind": kind, "texts": list(texts)}))
+
+    def stats(self) -> Dict[str, Any]:
+        return self._roundtrip({"kind": "stats"})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared embedding sidecar over a Unix socket")
+    parser.add_argument("--socket", default=EMBEDDING_SOCKET or "/tmp/fitness-embed.sock")
+    parser.add_argument("--max-batch", type=int, default=EMBED_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=EMBED_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    from server.mcp_agents.agent_helpers import load_local_embed_model
+
+    model = load_local_embed_model()
+    asyncio.run(EmbeddingServer(model, args.max_batch, args.max_wait_ms).serve(args.socket))
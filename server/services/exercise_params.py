@@ -0,0 +1,271 @@
+'''
+Parameter inference for the get_excercises tool.
+
+1. A deterministic extractor matches the message against muscle, type and
+   difficulty vocabularies (the api-ninjas values, synonyms, and whatever
+   the local Exercise catalog contains).
+2. Only when it finds nothing is Gemini asked; its answers are memoized by
+   normalized message.
+3. Every result is validated against ExerciseParams before it is used, so the
+   tool never receives values it cannot handle.
+'''
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+MUSCLES = {
+    "abdominals", "abductors", "adductors", "biceps", "calves", "chest", "forearms", "glutes",
+    "hamstrings", "lats", "lower_back", "middle_back", "neck", "quadriceps", "traps", "triceps",
+}
+TYPES = {"cardio", "olympic_weightlifting", "plyometrics", "powerlifting", "strength", "stretching", "strongman"}
+DIFFICULTIES = {"beginner", "intermediate", "expert"}
+
+MUSCLE_SYNONYMS = {
+    "abs": "abdominals", "core": "abdominals", "stomach": "abdominals", "six pack": "abdominals",
+    "bicep": "biceps", "tricep": "triceps", "calf": "calves", "pecs": "chest", "pec": "chest",
+    "glute": "glutes", "butt": "glutes", "hams": "hamstrings", "hamstring": "hamstrings",
+    "quads": "quadriceps", "quad": "quadriceps", "legs": "quadriceps", "leg": "quadriceps", "thighs": "quadriceps",
+    "lower back": "lower_back", "upper back": "middle_back", "back": "middle_back", "lat": "lats",
+    "shoulders": "traps", "shoulder": "traps", "trapezius": "traps", "forearm": "forearms", "grip": "forearms",
+    "inner thigh": "adductors", "outer thigh": "abductors", "hip": "abductors", "hips": "abductors",
+}
+TYPE_SYNONYMS = {
+    "stretch": "stretching", "mobility": "stretching", "flexibility": "stretching", "yoga": "stretching",
+    "plyo": "plyometrics", "jump": "plyometrics", "jumping": "plyometrics", "explosive": "plyometrics",
+    "weights": "strength", "lifting": "strength", "muscle": "strength", "hypertrophy": "strength",
+    "running": "cardio", "endurance": "cardio", "hiit": "cardio", "conditioning": "cardio",
+    "olympic": "olympic_weightlifting", "snatch": "olympic_weightlifting", "clean and jerk": "olympic_weightlifting",
+    "deadlift": "powerlifting", "squat": "powerlifting",
+}
+DIFFICULTY_SYNONYMS = {
+    "beginner": "beginner", "easy": "beginner", "novice": "beginner", "new to": "beginner", "starting out": "beginner",
+    "intermediate": "intermediate", "moderate": "intermediate", "medium": "intermediate",
+    "advanced": "expert", "expert": "expert", "hard": "expert", "intense": "expert", "challenging": "expert",
+}
+
+DEFAULT_PARAMS = {"type": "strength", "difficulty": "beginner", "offset": 0}
+CATALOG_VOCAB_TTL = 600
+LLM_CACHE_SIZE = 1024
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[\s\-]+", "_", value.strip().lower())
+
+
+class ExerciseParams(BaseModel):
+    name: Optional[str] = None
+    type: Optional[str] = None
+    muscle: Optional[str] = None
+    difficulty: Optional[str] = None
+    offset: int = Field(0, ge=0)
+
+    @field_validator("type")
+    @classmethod
+    def _check_type(cls, v):
+        if v is None:
+            return v
+        v = TYPE_SYNONYMS.get(v.strip().lower(), _slug(v))
+        if v not in TYPES:
+            raise ValueError(f"unknown exercise type '{v}'")
+        return v
+
+    @field_validator("muscle")
+    @classmethod
+    def _check_muscle(cls, v):
+        if v is None:
+            return v
+        v = MUSCLE_SYNONYMS.get(v.strip().lower(), _slug(v))
+        if v not in MUSCLES | catalog_vocabulary()["muscles"]:
+            raise ValueError(f"unknown muscle '{v}'")
+        return v
+
+    @field_validator("difficulty")
+    @classmethod
+    def _check_difficulty(cls, v):
+        if v is None:
+            return v
+        v = DIFFICULTY_SYNONYMS.get(v.strip().lower(), v.strip().lower())
+        if v not in DIFFICULTIES:
+            raise ValueError(f"unknown difficulty '{v}'")
+        return v
+
+    @field_validator("name")
+    @classmethod
+    def _blank_name(cls, v):
+        return v.strip() or None if isinstance(v, str) else v
+
+
+_catalog_lock = threading.Lock()
+_catalog_vocab: Dict[str, Set[str]] = {"muscles": set(), "types": set()}
+_catalog_loaded_at = 0.0
+
+
+def catalog_vocabulary() -> Dict[str, Set[str]]:
+    """Muscle groups and categories of the Exercise table as last loaded; never touches the DB."""
+    return _catalog_vocab
+
+
+def load_catalog_vocabulary():
+    """
+    Blocking reload of the catalog vocabulary. muscle_groups is a JSON column,
+    which Postgres cannot compare, so rows are deduplicated here rather than
+    with SELECT DISTINCT.
+    """
+    global _catalog_loaded_at
+    with _catalog_lock:
+        if time.time() - _catalog_loaded_at < CATALOG_VOCAB_TTL:
+            return
+        try:
+            from server.database import SessionLocal
+            from server.models import Exercise
+
+            muscles, types = set(), set()
+            with SessionLocal() as db:
+                for category, muscle_groups in db.query(Exercise.category, Exercise.muscle_groups):
+                    if category:
+                        types.add(_slug(category))
+                    for muscle in muscle_groups or []:
+                        if isinstance(muscle, str) and muscle.strip():
+                            muscles.add(_slug(muscle))
+            _catalog_vocab["muscles"], _catalog_vocab["types"] = muscles, types & TYPES
+        except Exception as e:
+            print(f"[WARN] could not load exercise catalog vocabulary: {e}")
+        _catalog_loaded_at = time.time()
+
+
+async def refresh_catalog_vocabulary():
+    """Reload the vocabulary off the event loop once it is older than CATALOG_VOCAB_TTL."""
+    if time.time() - _catalog_loaded_at >= CATALOG_VOCAB_TTL:
+        await asyncio.to_thread(load_catalog_vocabulary)
+
+
+def normalize_message(message: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", message.lower())).strip()
+
+
+def _find(text: str, vocabulary: Dict[str, str]) -> Optional[str]:
+    """Earliest vocabulary phrase in text (whole words); the longer phrase wins at the same position."""
+    best = None
+    for phrase, value in vocabulary.items():
+        match = re.search(rf"\b{re.escape(phrase)}s?\b", text)
+        if match and (best is None or (match.start(), -len(phrase)) < best[0]):
+            best = ((match.start(), -len(phrase)), value)
+    return best[1] if best else None
+
+
+def extract_params_locally(message: str) -> Optional[Dict[str, Any]]:
+    """Deterministic extraction; None when neither a muscle nor a type is mentioned."""
+    text = normalize_message(message)
+    catalog = catalog_vocabulary()
+
+    muscles = {m.replace("_", " "): m for m in MUSCLES | catalog["muscles"]}
+    muscles.update(MUSCLE_SYNONYMS)
+    types = {t.replace("_", " "): t for t in TYPES}
+    types.update(TYPE_SYNONYMS)
+
+    muscle = _find(text, muscles)
+    exercise_type = _find(text, types)
+    if muscle is None and exercise_type is None:
+        return None
+    params = {"muscle": muscle, "type": exercise_type, "difficulty": _find(text, DIFFICULTY_SYNONYMS), "offset": 0}
+    return {k: v for k, v in params.items() if v is not None}
+
+
+def validate_params(raw: Any) -> Optional[Dict[str, Any]]:
+    """
+    Coerce raw params into ExerciseParams. Unknown keys and invalid values are
+    dropped; None when nothing usable (no muscle, type or name) is left.
+    """
+    if not isinstance(raw, dict):
+        return None
+    fields = {k: raw[k] for k in ExerciseParams.model_fields if raw.get(k) is not None}
+    try:
+        params = ExerciseParams(**fields)
+    except ValidationError as e:
+        invalid = {err["loc"][0] for err in e.errors() if err.get("loc")}
+        print(f"[WARN] dropped invalid exercise params {sorted(invalid)} from {raw}")
+        try:
+            params = ExerciseParams(**{k: v for k, v in fields.items() if k not in invalid})
+        except ValidationError:
+            return None
+    result = params.model_dump(exclude_none=True)
+    if not ({"muscle", "type", "name"} & result.keys()):
+        return None
+    return result
+
+
+class _LRU:
+    def __init__(self, size: int):
+        self.size = size
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return dict(value)
+
+    def put(self, key: str, value: Dict[str, Any]):
+        self._data[key] = dict(value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+
+_llm_cache = _LRU(LLM_CACHE_SIZE)
+stats = {"local": 0, "llm_cached": 0, "llm": 0, "default": 0}
+
+
+async def infer_exercise_params(message: str) -> Dict[str, Any]:
+    """Tool parameters for a training question; always returns a valid dict."""
+    await refresh_catalog_vocabulary()
+    local = validate_params(extract_params_locally(message))
+    if local:
+        stats["local"] += 1
+        return local
+
+    key = normalize_message(message)
+    cached = _llm_cache.get(key)
+    if cached is not None:
+        stats["llm_cached"] += 1
+        return cached
+
+    from server.services.llm_helper import infer_excercise_params
+
+    try:
+        params = validate_params(await infer_excercise_params(user_message=message))
+    except Exception as e:
+        print(f"[WARN] exercise param inference failed: {e}")
+        params = None
+    if not params:
+        stats["default"] += 1
+        return dict(DEFAULT_PARAMS)
+
+    stats["llm"] += 1
+    _llm_cache.put(key, params)
+    return params
+
+
+def catalog_filters(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Translate get_excercises params into search_exercises filters for the local catalog index."""
+    levels = {"beginner": 1, "intermediate": 2, "expert": 3}
+    filters: Dict[str, Any] = {"offset": params.get("offset", 0)}
+    if params.get("muscle"):
+        filters["muscle"] = [params["muscle"]]
+    if params.get("type"):
+        filters["category"] = [params["type"]]
+    if params.get("difficulty") in levels:
+        filters["max_difficulty"] = levels[params["difficulty"]]
+    if params.get("name"):
+        filters["name"] = params["name"]
+    return filters
@@ -0,0 +1,336 @@
+'''
+Shared outbound client layer for every upstream the server talks to
+(USDA, Google OAuth/Fit, the MCP server, api-ninjas, Gemini).
+
+Each upstream gets its own pooled httpx client (HTTP/2 when `h2` is installed),
+timeouts, a token-bucket rate limit, jittered retries and a circuit breaker,
+so a slow or failing upstream cannot tie up every worker.
+'''
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited because the upstream's breaker is open."""
+
+
+@dataclass
+class UpstreamConfig:
+    name: str
+    base_url: str = ""
+    timeout: float = 10.0
+    connect_timeout: float = 3.0
+    max_connections: int = 20
+    max_keepalive: int = 10
+    rate_per_sec: float = 20.0
+    burst: int = 20
+    retries: int = 2
+    retry_non_idempotent: bool = False
+    backoff_base: float = 0.2
+    backoff_max: float = 3.0
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, burst: int):
+        self.rate = rate_per_sec
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """Classic closed -> open -> half-open breaker counting consecutive failures."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN:
+            # let exactly one probe through until it reports back
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.state = self.CLOSED
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """The probe ended without an answer (cancelled, caller error): let the next call probe."""
+        self._probe_in_flight = False
+
+
+class UpstreamMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.short_circuited = 0
+        self.status_counts: Dict[str, int] = {}
+        self.latency_total_ms = 0.0
+        self.latency_max_ms = 0.0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS_MS)
+
+    def observe(self, elapsed_ms: float, outcome: str):
+        self.requests += 1
+        self.status_counts[outcome] = self.status_counts.get(outcome, 0) + 1
+        self.latency_total_ms += elapsed_ms
+        self.latency_max_ms = max(self.latency_max_ms, elapsed_ms)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.latency_buckets[i] += 1
+                break
+
+    def _percentile(self, q: float) -> Optional[float]:
+        if not self.requests:
+            return None
+        target = q * self.requests
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.latency_buckets):
+            seen += count
+            if seen >= target:
+                return bound if bound != float("inf") else self.latency_max_ms
+        return self.latency_max_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "short_circuited": self.short_circuited,
+            "outcomes": dict(self.status_counts),
+            "latency_ms": {
+                "avg": round(self.latency_total_ms / self.requests, 2) if self.requests else None,
+                "p50_le": self._percentile(0.50),
+                "p95_le": self._percentile(0.95),
+                "max": round(self.latency_max_ms, 2),
+            },
+        }
+
+
+class Upstream:
+    def __init__(self, config: UpstreamConfig):
+        self.config = config
+        self.bucket = TokenBucket(config.rate_per_sec, config.burst)
+        self.breaker = CircuitBreaker(config.failure_threshold, config.reset_timeout)
+        self.metrics = UpstreamMetrics()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            cfg = self.config
+            self._client = httpx.AsyncClient(
+                base_url=cfg.base_url,
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(cfg.timeout, connect=cfg.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=cfg.max_connections,
+                    max_keepalive_connections=cfg.max_keepalive,
+                ),
+            )
+        return self._client
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter" exponential backoff
+        cap = min(self.config.backoff_max, self.config.backoff_base * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def _guard(self):
+        if not self.breaker.allow():
+            self.metrics.short_circuited += 1
+            raise CircuitOpenError(f"Upstream '{self.config.name}' is unavailable (circuit open)")
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send an HTTP request through the upstream's pooled client.
+        Transport errors and retryable status codes are retried with jittered
+        backoff; the final response is returned as-is for the caller to check.
+        """
+        method = method.upper()
+        retries = self.config.retries if (method in IDEMPOTENT_METHODS or self.config.retry_non_idempotent) else 0
+
+        for attempt in range(retries + 1):
+            self._guard()
+            started = time.perf_counter()
+            try:
+                await self.bucket.acquire()
+                started = time.perf_counter()
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                self.metrics.observe((time.perf_counter() - started) * 1000, type(e).__name__)
+                self.metrics.errors += 1
+                self.breaker.record_failure()
+                if attempt >= retries:
+                    raise
+            except BaseException:
+                # cancelled or not the upstream's fault: says nothing about its health
+                self.breaker.release_probe()
+                raise
+            else:
+                self.metrics.observe((time.perf_counter() - started) * 1000, str(response.status_code))
+                if response.status_code >= 500:
+                    self.metrics.errors += 1
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code not in RETRYABLE_STATUS or attempt >= retries:
+                    return response
+                await response.aclose()
+            self.metrics.retries += 1
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], retry: bool = False, timeout: Optional[float] = None) -> Any:
+        """
+        Run an arbitrary awaitable (SDK call, MCP round trip, ...) under this
+        upstream's breaker, rate limit, timeout and metrics.
+        """
+        retries = self.config.retries if retry else 0
+        timeout = timeout or self.config.timeout
+
+        for attempt in range(retries + 1):
+            self._guard()
+            started = time.perf_counter()
+            try:
+                await self.bucket.acquire()
+                started = time.perf_counter()
+                result = await asyncio.wait_for(fn(), timeout=timeout)
+            except asyncio.CancelledError:
+                # e.g. the client disconnected mid-stream; don't leave a half-open probe pending
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                self.metrics.observe((time.perf_counter() - started) * 1000, type(e).__name__)
+                self.metrics.errors += 1
+                self.breaker.record_failure()
+                if attempt >= retries:
+                    raise
+                self.metrics.retries += 1
+                await asyncio.sleep(self._backoff(attempt))
+            else:
+                self.metrics.observe((time.perf_counter() - started) * 1000, "ok")
+                self.breaker.record_success()
+                return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            **self.metrics.snapshot(),
+        }
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+UPSTREAM_CONFIGS = {
+    "usda": UpstreamConfig(name="usda", base_url="https://api.nal.usda.gov", timeout=8.0),
+    "google_oauth": UpstreamConfig(name="google_oauth", base_url="https://oauth2.googleapis.com", retries=0),
+    "google_fit": UpstreamConfig(
+        name="google_fit",
+        base_url="https://www.googleapis.com/fitness/v1",
+        timeout=15.0,
+        rate_per_sec=10.0,
+        burst=10,
+        # dataset:aggregate is a read-only POST, safe to retry
+        retry_non_idempotent=True,
+    ),
+    "api_ninjas": UpstreamConfig(name="api_ninjas", base_url="https://api.api-ninjas.com", timeout=8.0),
+    # retries apply to read-only tools only (call_mcp_tool passes retry=True for those)
+    "mcp": UpstreamConfig(name="mcp", timeout=_env_float("MCP_TIMEOUT", 20.0), retries=1),
+    "gemini": UpstreamConfig(
+        name="gemini",
+        timeout=_env_float("GEMINI_TIMEOUT", 60.0),
+        rate_per_sec=_env_float("GEMINI_RATE_PER_SEC", 10.0),
+        burst=20,
+        # completions are never retried: a retry repeats a slow, billed generation
+        retries=0,
+    ),
+}
+
+_upstreams: Dict[str, Upstream] = {}
+
+
+def get_upstream(name: str) -> Upstream:
+    """Return the process-wide Upstream for `name`, creating it on first use."""
+    upstream = _upstreams.get(name)
+    if upstream is None:
+        config = UPSTREAM_CONFIGS.get(name) or UpstreamConfig(name=name)
+        upstream = _upstreams[name] = Upstream(config)
+    return upstream
+
+
+def upstream_metrics() -> Dict[str, Any]:
+    return {name: upstream.snapshot() for name, upstream in _upstreams.items()}
+
+
+async def close_upstreams():
+    for upstream in _upstreams.values():
+        await upstream.aclose()
@@ -0,0 +1,214 @@
+'''
+Local intent classifier used before falling back to the LLM.
+
+TF-IDF over word unigrams/bigrams with a nearest-centroid (cosine) decision.
+Prediction is a handful of dict lookups, well under a millisecond. The model
+is seeded with hand-written examples and can be retrained from logged user
+ChatMessages whose intent was assigned by the LLM or a human (never from
+labels this classifier or the keyword rules produced, which would only
+reinforce their own mistakes):
+
+    python -m server.services.intent_classifier --train
+'''
+import argparse
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+INTENTS = [
+    "daily_summary",
+    "nutrition_advice",
+    "training_suggestion",
+    "sleep_advice",
+    "motivation",
+    "fitness_tips",
+    "general",
+]
+
+SEED_EXAMPLES: Dict[str, List[str]] = {
+    "daily_summary": [
+        "how did i do today", "give me a summary of my day", "what did i log today",
+        "show my progress this week", "how many calories have i eaten today",
+        "recap my stats", "how am i tracking against my goal", "what's my status today",
+    ],
+    "nutrition_advice": [
+        "what should i eat for dinner", "how much protein should i eat", "is rice good for weight loss",
+        "suggest a healthy breakfast", "how many carbs should i have", "what foods are high in fiber",
+        "am i eating enough calories", "healthy snack ideas", "should i cut sugar", "diet plan for fat loss",
+    ],
+    "training_suggestion": [
+        "give me a chest workout", "what exercises for legs", "plan a beginner strength routine",
+        "how should i train my back", "suggest a cardio session", "exercises with dumbbells at home",
+        "build a workout for biceps", "what should i do at the gym today", "routine to grow shoulders",
+    ],
+    "sleep_advice": [
+        "how can i fall asleep faster", "i keep waking up at night", "how many hours should i rest",
+        "tips for better rest", "i feel tired every morning", "what time should i go to bed",
+        "is napping bad", "insomnia help",
+    ],
+    "motivation": [
+        "i feel like giving up", "motivate me", "i'm not seeing results", "i skipped the gym again",
+        "how do i stay consistent", "i have no energy to work out", "encourage me", "i feel lazy today",
+    ],
+    "fitness_tips": [
+        "how do i improve my form", "how to warm up properly", "tips to run faster",
+        "how to avoid injury while lifting", "should i stretch before exercise", "how to increase stamina",
+        "how long should i rest between sets", "give me a fitness tip",
+    ],
+    "general": [
+        "hello", "hi there", "thanks", "who are you", "what can you do", "good morning",
+        "ok", "thank you so much", "what is this app",
+    ],
+}
+
+MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", 0.3))
+MIN_MARGIN = float(os.getenv("INTENT_MIN_MARGIN", 0.08))
+# ChatMessage.intent_source values independent of this model; --train only learns from these
+TRAINING_SOURCES = ("llm", "human")
+INTENT_MODEL_PATH = os.getenv(
+    "INTENT_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "storage", "intent_model.json"),
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text: str) -> List[str]:
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def _normalize(vec: Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    return {k: v / norm for k, v in vec.items()} if norm else vec
+
+
+class IntentClassifier:
+    def __init__(self, idf: Optional[Dict[str, float]] = None, centroids: Optional[Dict[str, Dict[str, float]]] = None):
+        self.idf = idf or {}
+        self.centroids = centroids or {}
+
+    def vectorize(self, text: str) -> Dict[str, float]:
+        counts = Counter(t for t in tokenize(text) if t in self.idf)
+        return _normalize({t: (1 + math.log(c)) * self.idf[t] for t, c in counts.items()})
+
+    def fit(self, texts: List[str], labels: List[str]) -> "IntentClassifier":
+        doc_freq: Counter = Counter()
+        token_sets = [set(tokenize(t)) for t in texts]
+        for tokens in token_sets:
+            doc_freq.update(tokens)
+        n_docs = len(texts)
+        self.idf = {t: math.log((1 + n_docs) / (1 + df)) + 1 for t, df in doc_freq.items()}
+
+        sums: Dict[str, Counter] = {}
+        for text, label in zip(texts, labels):
+            sums.setdefault(label, Counter()).update(self.vectorize(text))
+        self.centroids = {label: _normalize(dict(vec)) for label, vec in sums.items()}
+        return self
+
+    def scores(self, text: str) -> List[Tuple[str, float]]:
+        vec = self.vectorize(text)
+        ranked = [
+            (label, sum(w * centroid.get(t, 0.0) for t, w in vec.items()))
+            for label, centroid in self.centroids.items()
+        ]
+        return sorted(ranked, key=lambda x: x[1], reverse=True)
+
+    def predict(self, text: str) -> Tuple[Optional[str], float, float]:
+        """Return (intent, confidence, margin over the runner-up); intent is None below threshold."""
+        ranked = self.scores(text)
+        if not ranked:
+            return None, 0.0, 0.0
+        best, confidence = ranked[0]
+        margin = confidence - (ranked[1][1] if len(ranked) > 1 else 0.0)
+        if confidence < MIN_CONFIDENCE or margin < MIN_MARGIN:
+            return None, confidence, margin
+        return best, confidence, margin
+
+    def to_dict(self) -> Dict:
+        return {"idf": self.idf, "centroids": self.centroids}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "IntentClassifier":
+        return cls(idf=data["idf"], centroids=data["centroids"])
+
+    def save(self, path: str = INTENT_MODEL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+
+
+def seed_dataset() -> Tuple[List[str], List[str]]:
+    texts, labels = [], []
+    for intent, examples in SEED_EXAMPLES.items():
+        texts.extend(examples)
+        labels.extend([intent] * len(examples))
+    return texts, labels
+
+
+def train(extra: Iterable[Tuple[str, str]] = ()) -> IntentClassifier:
+    texts, labels = seed_dataset()
+    for text, label in extra:
+        if label in INTENTS and text:
+            texts.append(text)
+            labels.append(label)
+    return IntentClassifier().fit(texts, labels)
+
+
+def load_labelled_history(db, limit: int = 50000) -> List[Tuple[str, str]]:
+    """Independently labelled user messages from the chat log (most recent first)."""
+    from server.models import ChatMessage
+
+    rows = (
+        db.query(ChatMessage.content, ChatMessage.intent)
+        .filter(ChatMessage.role == "user", ChatMessage.intent.isnot(None),
+                ChatMessage.intent_source.in_(TRAINING_SOURCES))
+        .order_by(ChatMessage.timestamp.desc())
+        .limit(limit)
+        .all()
+    )
+    return [(content, intent) for content, intent in rows]
+
+
+_classifier: Optional[IntentClassifier] = None
+
+
+def get_intent_classifier() -> IntentClassifier:
+    """Load the trained model from INTENT_MODEL_PATH, or fit one on the seed examples."""
+    global _classifier
+    if _classifier is None:
+        if os.path.exists(INTENT_MODEL_PATH):
+            with open(INTENT_MODEL_PATH, encoding="utf-8") as f:
+                _classifier = IntentClassifier.from_dict(json.load(f))
+        else:
+            _classifier = train()
+    return _classifier
+
+
+def classify_intent_local(message: str) -> Optional[str]:
+    intent, _, _ = get_intent_classifier().predict(message)
+    return intent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the local intent classifier")
+    parser.add_argument("--train", action="store_true", help="retrain from seeds plus logged ChatMessage intents")
+    parser.add_argument("--output", default=INTENT_MODEL_PATH)
+    parser.add_argument("message", nargs="*", help="classify a message with the current model")
+    args = parser.parse_args()
+
+    if args.train:
+        from server.database import SessionLocal
+
+        with SessionLocal() as db:
+            history = load_labelled_history(db)
+        model = train(history)
+        model.save(args.output)
+        print(f"trained on {len(history)} logged messages + seeds, saved to {args.output}")
+
+    if args.message:
+        text = " ".join(args.message)
+        print(get_intent_classifier().predict(text), get_intent_classifier().scores(text)[:3])
@@ -0,0 +1,165 @@
+'''
+Gateway for all Gemini calls.
+
+Completions use the SDK's native async API (no shared default executor), are
+bounded by a global concurrency limit and wait in a priority queue, so
+interactive chat turns are served ahead of background jobs. Every call has a
+timeout and the queue exposes depth/wait metrics.
+'''
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from server.services.http_client import get_upstream
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 10
+
+
+class PrioritySemaphore:
+    """
+    Semaphore whose waiters are woken lowest-priority-value first (FIFO within
+    a priority). A released slot is handed directly to the next waiter.
+    """
+
+    def __init__(self, value: int):
+        self._free = value
+        self.max_depth = 0
+        self._waiters: List = []
+        self._seq = itertools.count()
+
+    def waiting(self) -> Dict[str, int]:
+        depth: Dict[str, int] = {}
+        for priority, _, fut in self._waiters:
+            if not fut.done():
+                name = Priority(priority).name.lower()
+                depth[name] = depth.get(name, 0) + 1
+        return depth
+
+    async def acquire(self, priority: Priority):
+        if self._free > 0 and not self._waiters:
+            self._free -= 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        entry = (int(priority), next(self._seq), fut)
+        heapq.heappush(self._waiters, entry)
+        self.max_depth = max(self.max_depth, len(self._waiters))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # slot was handed over just as we were cancelled; pass it on
+                self.release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._free += 1
+
+
+class LLMGateway:
+    def __init__(self, model, max_concurrency: int, timeout: float):
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._slots = PrioritySemaphore(max_concurrency)
+        self.in_flight = 0
+        self.completed: Dict[str, int] = {}
+        self.timeouts = 0
+        self.failures = 0
+        self.wait_ms_total: Dict[str, float] = {}
+
+    @asynccontextmanager
+    async def _slot(self, priority: Priority):
+        name = priority.name.lower()
+        queued_at = time.perf_counter()
+        await self._slots.acquire(priority)
+        self.wait_ms_total[name] = self.wait_ms_total.get(name, 0.0) + (time.perf_counter() - queued_at) * 1000
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            self.completed[name] = self.completed.get(name, 0) + 1
+
+    async def generate(self, prompt: str, priority: Priority = Priority.INTERACTIVE,
+                       timeout: Optional[float] = None):
+        """Run one completion and return the SDK response object."""
+        timeout = timeout or self.timeout
+        async with self._slot(priority):
+            try:
+                return await get_upstream("gemini").call(
+                    lambda: self.model.generate_content_async(prompt), timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+            except Exception:
+                self.failures += 1
+                raise
+
+    async def stream(self, prompt: str, priority: Priority = Priority.INTERACTIVE,
+                     timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Yield text deltas of a streamed completion. The slot is held until the
+        stream finishes; `timeout` bounds the first response and each gap between chunks.
+        """
+        timeout = timeout or self.timeout
+        async with self._slot(priority):
+            try:
+                response = await get_upstream("gemini").call(
+                    lambda: self.model.generate_content_async(prompt, stream=True), timeout=timeout
+                )
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                    except StopAsyncIteration:
+                        break
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # chunk carried no text part (e.g. finish/safety metadata only)
+                        continue
+                    if text:
+                        yield text
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+            except Exception:
+                self.failures += 1
+                raise
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self._slots.waiting(),
+            "max_queue_depth": self._slots.max_depth,
+            "completed": dict(self.completed),
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "avg_wait_ms": {
+                name: round(total / self.completed[name], 2)
+                for name, total in self.wait_ms_total.items() if self.completed.get(name)
+            },
+        }
+
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 45))
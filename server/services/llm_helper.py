@@ -2,10 +2,12 @@ import os
 from typing import List,Optional
 from google import generativeai
 import google.generativeai as genai
-import asyncio
 import re
-from typing import Dict,Any
+from typing import Dict,Any,AsyncIterator
 import json
+from server.services.llm_gateway import LLMGateway, Priority, LLM_MAX_CONCURRENCY, LLM_TIMEOUT
+from server.services.context_builder import build_prompt
+from server.services.exercise_params import MUSCLES, TYPES, DIFFICULTIES
 
 
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
@@ -17,12 +19,23 @@ Keep your tone encouraging, supportive, and informative.
 If data is missing, clearly say so instead of guessing.
 """
 
+FALLBACK_RESPONSE="I'm sorry, I couldn’t generate a response."
+
 model=genai.GenerativeModel("gemini-2.0-flash")
 
+# All Gemini traffic goes through one gateway: native async calls, a global
+# concurrency cap and a priority queue (chat ahead of background jobs).
+llm_gateway=LLMGateway(model, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT)
+
+
+async def _generate(prompt:str, priority:Priority=Priority.INTERACTIVE):
+    return await llm_gateway.generate(prompt, priority=priority)
+
 
 async def infer_excercise_params(user_data:Dict[str,Any]=None,user_message:str=None):
     """
     Asking Gemini to infer appropriate parameters for the exercise API based on user goals, body part, and context.
+    Returns the raw parsed JSON (possibly empty); callers validate it, see services/exercise_params.py.
     """
     context=f"""
     User message: "{user_message}"
@@ -34,16 +47,16 @@ async def infer_excercise_params(user_data:Dict[str,Any]=None,user_message:str=N
 
     Valid parameter keys:
     - name (specific exercise name, optional)
-    - type (e.g. 'strength', 'cardio', 'stretching', 'plyometrics')
-    - muscle (e.g. 'chest', 'back', 'legs', 'shoulders', 'biceps', 'core')
-    - difficulty (beginner, intermediate, advanced)
+    - type (one of: {', '.join(sorted(TYPES))})
+    - muscle (one of: {', '.join(sorted(MUSCLES))})
+    - difficulty (one of: {', '.join(sorted(DIFFICULTIES))})
     - offset (default 0)
 
     Return only a valid JSON object like:
     {{
         "name": null,
         "type": "strength",
-        "muscle": "legs",
+        "muscle": "quadriceps",
         "difficulty": "intermediate",
         "offset": 0
     }}
@@ -51,93 +64,74 @@ async def infer_excercise_params(user_data:Dict[str,Any]=None,user_message:str=N
     {context}
     """
 
-    loop=asyncio.get_event_loop()
-    response=await loop.run_in_executor(
-        None,
-        lambda:model.generate_content(prompt)
-    )
+    response=await _generate(prompt)
     text=response.text.strip()
     match = re.search(r"\{.*\}", text, re.DOTALL)
     if match:
         try:
-            params = json.loads(match.group())
-            return params
+            return json.loads(match.group())
         except json.JSONDecodeError as e:
             print(f"[JSON ERROR] {e}, raw response: {text}")
-            
-        return {"muscle": "full body", "type": "strength", "difficulty": "beginner", "offset": 0}
+    return {}
     
 ##########################################################################################################
 async def query_llm_intent(
         user_message:str)->str:
-    loop = asyncio.get_event_loop()
-    response = await loop.run_in_executor(
-        None,
-        lambda: model.generate_content(user_message)
+    response = await _generate(user_message)
+    return response.text.strip() if response and response.text else FALLBACK_RESPONSE
+
+def build_conversation_prompt(
+        user_message:str,
+        chat_history:List[dict],
+        tool_outputs:Optional[Dict[str,Any]],
+        retrieved_docs:Optional[List[str]]=None,
+        intent:Optional[str]="general",
+        summary:Optional[str]=None
+        ) -> str:
+    """Assemble the system prompt, summary, recent turns, retrieved docs and tool output within the token budget."""
+    return build_prompt(
+        SYSTEM_PROMPT,
+        user_message=user_message,
+        chat_history=chat_history,
+        tool_outputs=tool_outputs,
+        retrieved_docs=retrieved_docs,
+        intent=intent,
+        summary=summary,
     )
-    return response.text.strip() if response and response.text else "I'm sorry, I couldn’t generate a response."
+
+
+async def generate_text(prompt:str, priority:Priority=Priority.INTERACTIVE) -> Optional[str]:
+    response = await _generate(prompt, priority=priority)
+    return response.text.strip() if response and response.text else None
+
 
 async def query_llm(
         user_message:str,
         chat_history:List[dict],
         tool_outputs:Optional[Dict[str,Any]],
         retrieved_docs:Optional[List[str]]=None,
-        intent:Optional[str]="general"
+        intent:Optional[str]="general",
+        summary:Optional[str]=None
         ) -> str:
-    
-    conversation_text = SYSTEM_PROMPT + "\n\n"
-    for m in chat_history[-5:]:  # include last few turns
-        conversation_text += f"{m['role'].capitalize()}: {m['content']}\n"
-    conversation_text += f"User: {user_message}\n\n"
-
-    # Add retrieved documents if available
-    if retrieved_docs:
-        docs_text = "\n\n".join(retrieved_docs[:3])  # limit size
-        conversation_text += f"[Context from {intent} documents]\n{docs_text}\n\n"
-
-    if tool_outputs:
-        if hasattr(tool_outputs, "structured_content") and "result" in tool_outputs.structured_content:
-            output = tool_outputs.structured_content["result"]
-        elif hasattr(tool_outputs, "content"):
-            output = tool_outputs.content
-        else:
-            output = []
-        tool_name = getattr(tool_outputs, "tool_id", "tool_output")
-
-
-        if isinstance(output, list):
-            # List of dicts (like exercises)
-            formatted_items = "\n".join([
-                f"- {item.get('name', 'Unnamed')} ({item.get('type', 'N/A')} - {item.get('difficulty', 'N/A')})\n"
-                f"  Muscle: {item.get('muscle', 'N/A')}\n"
-                f"  Instructions: {item.get('instructions', 'No instructions')}"
-                for item in output
-            ])
-            conversation_text += f"[{tool_name}]\n{formatted_items}\n\n"
-
-        elif isinstance(output, dict):
-            # Single dict output
-            formatted_items = "\n".join([f"{k}: {v}" for k, v in output.items()])
-            conversation_text += f"[{tool_name}]\n{formatted_items}\n\n"
-
-        else:
-            # Fallback
-            conversation_text += f"[{tool_name}]\n{str(output)}\n\n"
-
-        # Prompt LLM to integrate tool outputs
-        conversation_text += (
-            "Using the above data, write a clear, concise, and friendly response to the user.\n\n"
-            "including advice or formatting as appropriate.\n\n"
-        )
-
-
-    # Run generation (Gemini is synchronous, so wrap in thread to make async)
-    
-    loop = asyncio.get_event_loop()
-    response = await loop.run_in_executor(
-        None,
-        lambda: model.generate_content(conversation_text)
-    )
+    conversation_text = build_conversation_prompt(user_message, chat_history, tool_outputs, retrieved_docs, intent, summary)
+
+    response = await _generate(conversation_text)
 
     # Extract and return clean text
-    return response.text.strip() if response and response.text else "I'm sorry, I couldn’t generate a response."
\ No newline at end of file
+    return response.text.strip() if response and response.text else FALLBACK_RESPONSE
+
+
+async def query_llm_stream(
+        user_message:str,
+        chat_history:List[dict],
+        tool_outputs:Optional[Dict[str,Any]],
+        retrieved_docs:Optional[List[str]]=None,
+        intent:Optional[str]="general",
+        summary:Optional[str]=None
+        ) -> AsyncIterator[str]:
+    """
+    Same prompt as query_llm, but yields text deltas as Gemini generates them.
+    """
+    conversation_text = build_conversation_prompt(user_message, chat_history, tool_outputs, retrieved_docs, intent, summary)
+    async for text in llm_gateway.stream(conversation_text, priority=Priority.INTERACTIVE):
+        yield text
\ No newline at end of file
@@ -0,0 +1,154 @@
+'''
+Debounced, change-driven re-indexing of daily knowledge documents.
+
+Routes that write food, water, sleep or stats call `enqueue_reindex(user_id,
+day)` after committing. Repeated writes for the same (user, day) within
+REINDEX_DEBOUNCE seconds are coalesced into one job (a steady stream of
+writes is still flushed after REINDEX_MAX_DELAY). Due jobs are handed in
+batches to REINDEX_WORKERS workers, which rebuild the documents and embed only
+those whose hash changed (backfill.process_chunk), off the request path.
+A batch that fails (Qdrant, database or embedding sidecar down) is put back
+with exponential backoff, up to REINDEX_MAX_ATTEMPTS times per (user, day).
+
+The scheduler and workers run in the app lifespan (start/stop).
+'''
+import asyncio
+import os
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+REINDEX_DEBOUNCE = float(os.getenv("REINDEX_DEBOUNCE", 30))
+REINDEX_MAX_DELAY = float(os.getenv("REINDEX_MAX_DELAY", 300))
+REINDEX_WORKERS = int(os.getenv("REINDEX_WORKERS", 2))
+REINDEX_BATCH = int(os.getenv("REINDEX_BATCH", 32))
+REINDEX_MAX_ATTEMPTS = int(os.getenv("REINDEX_MAX_ATTEMPTS", 5))
+REINDEX_RETRY_BASE = float(os.getenv("REINDEX_RETRY_BASE", 30))
+REINDEX_RETRY_MAX = float(os.getenv("REINDEX_RETRY_MAX", 900))
+TICK_SECONDS = 1.0
+
+UserDate = Tuple[int, date]
+
+
+class ReindexQueue:
+    def __init__(self, debounce: float = REINDEX_DEBOUNCE, max_delay: float = REINDEX_MAX_DELAY,
+                 workers: int = REINDEX_WORKERS, batch: int = REINDEX_BATCH):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.workers = max(workers, 1)
+        self.batch = batch
+        # (user_id, day) -> (first enqueued, due at); written from request threads
+        self._pending: Dict[UserDate, Tuple[float, float]] = {}
+        # (user_id, day) -> failed attempts so far
+        self._attempts: Dict[UserDate, int] = {}
+        self._lock = threading.Lock()
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {"enqueued": 0, "coalesced": 0, "batches": 0, "indexed": 0,
+                      "unchanged": 0, "empty": 0, "failures": 0, "retried": 0, "dropped": 0}
+
+    def enqueue(self, user_id: int, day: date, delay: Optional[float] = None):
+        """Thread-safe; safe to call from sync route handlers after db.commit()."""
+        with self._lock:
+            self.stats["enqueued"] += 1
+            self._schedule((user_id, day), self.debounce if delay is None else delay)
+
+    def _schedule(self, key: UserDate, delay: float):
+        # caller holds self._lock
+        now = time.monotonic()
+        first_seen, _ = self._pending.get(key, (now, now))
+        if key in self._pending:
+            self.stats["coalesced"] += 1
+        self._pending[key] = (first_seen, min(now + delay, first_seen + self.max_delay))
+
+    def _retry(self, pairs: List[UserDate]):
+        """Put a failed batch back with exponential backoff; give up after REINDEX_MAX_ATTEMPTS."""
+        dropped = []
+        with self._lock:
+            for key in pairs:
+                attempt = self._attempts.get(key, 0) + 1
+                if attempt >= REINDEX_MAX_ATTEMPTS:
+                    self._attempts.pop(key, None)
+                    self.stats["dropped"] += 1
+                    dropped.append(key)
+                    continue
+                self._attempts[key] = attempt
+                self.stats["retried"] += 1
+                self._schedule(key, min(REINDEX_RETRY_BASE * 2 ** (attempt - 1), REINDEX_RETRY_MAX))
+        if dropped:
+            print(f"[WARN] giving up on reindexing {dropped} after {REINDEX_MAX_ATTEMPTS} attempts")
+
+    def _pop_due(self) -> List[UserDate]:
+        now = time.monotonic()
+        with self._lock:
+            due = [key for key, (_, due_at) in self._pending.items() if due_at <= now]
+            for key in due:
+                del self._pending[key]
+        return due
+
+    async def _scheduler(self):
+        while True:
+            due = self._pop_due()
+            for start in range(0, len(due), self.batch):
+                await self._ready.put(due[start:start + self.batch])
+            await asyncio.sleep(TICK_SECONDS)
+
+    def _process(self, pairs: List[UserDate]) -> Dict[str, int]:
+        from server.database import SessionLocal
+        from server.knowledge_base.backfill import process_chunk
+
+        with SessionLocal() as db:
+            return process_chunk(db, pairs, pool=None, embed_batch=len(pairs))
+
+    async def _worker(self, index: int):
+        while True:
+            pairs = await self._ready.get()
+            try:
+                result = await asyncio.to_thread(self._process, pairs)
+                with self._lock:
+                    for key in pairs:
+                        self._attempts.pop(key, None)
+                self.stats["batches"] += 1
+                for key in ("indexed", "unchanged", "empty"):
+                    self.stats[key] += result.get(key, 0)
+                if result.get("indexed"):
+                    print(f"[DEBUG] reindex worker {index}: {result}")
+            except Exception as e:
+                self.stats["failures"] += 1
+                print(f"[WARN] reindex of {pairs} failed: {e}")
+                self._retry(pairs)
+            finally:
+                self._ready.task_done()
+
+    def start(self):
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._scheduler())]
+        self._tasks += [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            **self.stats,
+            "pending": pending,
+            "ready": self._ready.qsize() if self._ready else 0,
+            "running": bool(self._tasks),
+            "debounce_seconds": self.debounce,
+            "workers": self.workers,
+        }
+
+
+reindex_queue = ReindexQueue()
+
+
+def enqueue_reindex(user_id: int, day: date, delay: Optional[float] = None):
+    reindex_queue.enqueue(user_id, day, delay)
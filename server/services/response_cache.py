@@ -0,0 +1,144 @@
+'''
+Semantic cache for generic (non-personalized) chat answers.
+
+Entries are keyed by user and intent plus the embedding of the normalized
+query; a lookup hits when an entry of the same user and intent is within
+SIMILARITY_THRESHOLD (cosine). Answers are never shared between users: the
+message itself can carry personal details ("I'm Sam, 52, diabetic, ...")
+that the answer echoes. Entries expire after a TTL and the least recently
+used entry is evicted once an intent's bucket is full. Prompts that carry
+anything user-specific (retrieved documents, tool output, earlier turns of
+the session or its rolling summary) must bypass the cache.
+'''
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SIMILARITY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", 0.92))
+MAX_ENTRIES_PER_INTENT = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 512))
+TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL", 6 * 3600))
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    return _SPACE_RE.sub(" ", _PUNCT_RE.sub(" ", text.lower())).strip()
+
+
+class SemanticCache:
+    def __init__(self, embed_fn: Callable[[str], List[float]], threshold: float = SIMILARITY_THRESHOLD,
+                 max_entries: int = MAX_ENTRIES_PER_INTENT, ttl: float = TTL_SECONDS):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # intent -> OrderedDict[(user_id, normalized query) -> (unit vector, response, stored_at)]
+        self._buckets: Dict[str, "OrderedDict[Tuple[int, str], Tuple[np.ndarray, str, float]]"] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    def _embed(self, query: str) -> np.ndarray:
+        vec = np.asarray(self.embed_fn(query), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _expire(self, bucket, now: float):
+        expired = [k for k, (_, _, stored_at) in bucket.items() if now - stored_at > self.ttl]
+        for k in expired:
+            del bucket[k]
+            self.evictions += 1
+
+    def lookup(self, intent: str, message: str, user_id: int) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Return (cached response or None, query vector), searching only this user's
+        entries. The vector is handed back so a following `store` on a miss does
+        not embed the query twice.
+        """
+        key = (user_id, normalize_query(message))
+        now = time.time()
+        with self._lock:
+            bucket = self._buckets.get(intent)
+            if bucket:
+                self._expire(bucket, now)
+                exact = bucket.get(key)
+                if exact is not None:
+                    bucket.move_to_end(key)
+                    self.hits += 1
+                    return exact[1], exact[0]
+            keys = [k for k in bucket if k[0] == user_id] if bucket else []
+            matrix = np.stack([bucket[k][0] for k in keys]) if keys else None
+
+        vector = self._embed(key[1])
+        if matrix is not None:
+            sims = matrix @ vector
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                with self._lock:
+                    entry = self._buckets.get(intent, {}).get(keys[best])
+                    if entry is not None:
+                        self._buckets[intent].move_to_end(keys[best])
+                        self.hits += 1
+                        return entry[1], vector
+        with self._lock:
+            self.misses += 1
+        return None, vector
+
+    def store(self, intent: str, message: str, user_id: int, response: str, vector: Optional[np.ndarray] = None):
+        key = (user_id, normalize_query(message))
+        if vector is None:
+            vector = self._embed(key[1])
+        with self._lock:
+            bucket = self._buckets.setdefault(intent, OrderedDict())
+            bucket[key] = (vector, response, time.time())
+            bucket.move_to_end(key)
+            while len(bucket) > self.max_entries:
+                bucket.popitem(last=False)
+                self.evictions += 1
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "entries": {intent: len(bucket) for intent, bucket in self._buckets.items()},
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl,
+        }
+
+
+def is_cacheable(retrieved_docs: Optional[List[Any]], tool_outputs: Any,
+                 chat_history: Optional[List[Any]] = None, summary: Optional[str] = None) -> bool:
+    """
+    Only prompts without user documents, tool output or session context are
+    generic enough to reuse: history/summary can tailor an answer ("I'm
+    diabetic, ...") to a context the next, similar question doesn't have.
+    """
+    return not retrieved_docs and tool_outputs is None and not chat_history and not summary
+
+
+_cache: Optional[SemanticCache] = None
+
+
+def get_response_cache() -> SemanticCache:
+    global _cache
+    if _cache is None:
+        from server.mcp_agents.agent_helpers import embed_query
+
+        _cache = SemanticCache(embed_fn=embed_query)
+    return _cache
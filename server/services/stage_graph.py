@@ -0,0 +1,87 @@
+'''
+Tiny dependency-graph runner for request pipelines.
+
+Stages declare the stages they depend on; everything whose dependencies are
+satisfied runs concurrently, so total latency approaches the critical path.
+Per-stage timings are recorded on every run and aggregated for metrics.
+'''
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Tuple
+
+StageFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class StageGraph:
+    def __init__(self, name: str):
+        self.name = name
+        self._stages: Dict[str, Tuple[StageFn, Tuple[str, ...]]] = {}
+
+    def stage(self, name: str, fn: StageFn, deps: Iterable[str] = ()) -> "StageGraph":
+        """Register `fn(results)`; `results` holds the outputs of every finished dependency."""
+        deps = tuple(deps)
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self._stages[name] = (fn, deps)
+        return self
+
+    async def run(self) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """Run all stages; returns (results, timings in ms). The first failing stage cancels the rest."""
+        results: Dict[str, Any] = {}
+        timings: Dict[str, float] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        started = time.perf_counter()
+
+        async def run_stage(name: str):
+            fn, deps = self._stages[name]
+            if deps:
+                await asyncio.gather(*(tasks[d] for d in deps))
+            stage_start = time.perf_counter()
+            try:
+                results[name] = await fn(results)
+            finally:
+                timings[name] = round((time.perf_counter() - stage_start) * 1000, 2)
+
+        # stages are registered after their deps, so creation order is topological
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(run_stage(name))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        finally:
+            timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+            stage_metrics.record(self.name, timings)
+        return results, timings
+
+
+class StageMetrics:
+    def __init__(self):
+        self._totals: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    def record(self, pipeline: str, timings: Dict[str, float]):
+        per_stage = self._totals.setdefault(pipeline, {})
+        for stage, ms in timings.items():
+            agg = per_stage.setdefault(stage, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            agg["count"] += 1
+            agg["total_ms"] += ms
+            agg["max_ms"] = max(agg["max_ms"], ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            pipeline: {
+                stage: {
+                    "count": int(agg["count"]),
+                    "avg_ms": round(agg["total_ms"] / agg["count"], 2),
+                    "max_ms": agg["max_ms"],
+                }
+                for stage, agg in stages.items()
+            }
+            for pipeline, stages in self._totals.items()
+        }
+
+
+stage_metrics = StageMetrics()